@@ -0,0 +1,161 @@
+# --- MODO ADAPTATIVO CON PARADA TEMPRANA (S.A.P.E.) ---
+# En lugar de recorrer los 40 escenarios en orden, se pregunta primero el que más puede mover el
+# resultado (rango de IRE entre sus opciones + flags que puede hacer cruzar el umbral de trigger) y,
+# a partir de MIN_QUESTIONS, se simulan completaciones del resto del test con el modelo de respuesta
+# (frecuencias de los tests guardados con esa versión del banco, o uniforme). Si el nivel de
+# get_ire_text() y el conjunto de triggers coinciden en al menos `confidence` de las simulaciones, el
+# test se para y se informa con la completación mediana de ese resultado (las respuestas guardadas
+# son solo las reales).
+#
+#   python adaptive.py --bank SATE_v1.csv --sector TECH --paths 500 --confidence 0.95
+#   python adaptive.py --db resultados.db --sector TECH          (replay de tests guardados)
+import argparse
+import time
+import zlib
+
+import numpy as np
+
+from calibration import STRATEGIES, option_probabilities, sample_choices
+from scenario_bank import FLAG_KEYS, NO_ANSWER, OPTION_LETTERS, load_bank
+from scoring import IRE_HIGH, IRE_MEDIUM, results_batch, score_choices
+
+DEFAULT_CONFIDENCE = 0.95
+MIN_QUESTIONS = 10
+N_SIMULATIONS = 256
+TRIGGER_WEIGHT = 10.0  # puntos de IRE equivalentes a poder activar/desactivar un trigger
+
+# --- RESULTADO A PREDECIR ---
+def levels(ire):
+    # 0 = BAJO, 1 = MEDIO, 2 = ALTO; mismos cortes (y redondeo) que get_ire_text()
+    ire = np.round(ire, 2)
+    return (ire > IRE_MEDIUM).astype(np.int64) + (ire > IRE_HIGH)
+
+def outcome_codes(scores):
+    # Nivel y máscara de triggers en un solo entero por fila
+    res = results_batch(np.atleast_2d(scores))
+    mask = (res["triggers"].astype(np.int64) << np.arange(len(FLAG_KEYS))).sum(axis=1)
+    return levels(res["ire"]) << len(FLAG_KEYS) | mask
+
+# --- MODELO DE RESPUESTA ---
+def answer_model(bank, qids, counts=None, prior=1.0):
+    # Probabilidades acumuladas (preguntas x 4) por pregunta, solo sobre opciones disponibles;
+    # `counts` = [(fila del banco, letra, n)] de ResultsStore.option_counts()
+    freq = np.full((len(bank), len(OPTION_LETTERS)), prior)
+    for q, letter, n in counts or []:
+        if q < len(bank) and letter in OPTION_LETTERS: freq[q, OPTION_LETTERS.index(letter)] += n
+    weights = freq[qids] * bank.available[qids]
+    return np.cumsum(weights / weights.sum(axis=1, keepdims=True), axis=1)
+
+def seed_for(user_id): return zlib.crc32(str(user_id).encode("utf-8"))
+
+# --- SIMULACIÓN, INFLUENCIA Y PARADA ---
+def simulate(bank, qids, choices, scores, cum, rng, n=N_SIMULATIONS):
+    todo = np.flatnonzero(choices == NO_ANSWER)
+    if not len(todo): return np.atleast_2d(scores).copy()
+    return score_choices(bank, qids[todo], sample_choices(rng, cum[todo], n), validate=False, initial=scores)
+
+def assess(bank, qids, choices, scores, cum, rng, n=N_SIMULATIONS):
+    # (fracción de completaciones con el resultado más probable, completación mediana de ese resultado)
+    final = simulate(bank, qids, choices, scores, cum, rng, n)
+    codes = outcome_codes(final)
+    values, counts = np.unique(codes, return_counts=True)
+    mode = values[counts.argmax()]
+    idx = np.flatnonzero(codes == mode)
+    ire = results_batch(final[idx])["ire"]
+    return counts.max() / len(codes), final[idx[np.argsort(ire, kind="stable")[len(idx) // 2]]].copy()
+
+def influence(bank, qids, choices, scores):
+    # Por pregunta pendiente: cuánto puede mover el resultado la respuesta, dado el estado actual
+    todo = np.flatnonzero(choices == NO_ANSWER)
+    out = np.full(len(qids), -np.inf)
+    options = np.arange(len(OPTION_LETTERS), dtype=np.int8)[:, None]
+    for pos in todo:
+        q = qids[pos]
+        after = score_choices(bank, [q], options[bank.available[q]], validate=False, initial=scores)
+        res = results_batch(after)
+        flips = (res["triggers"].any(axis=0) != res["triggers"].all(axis=0)).sum()
+        out[pos] = np.ptp(res["ire"]) + TRIGGER_WEIGHT * flips
+    return out
+
+def next_step(bank, qids, choices, scores, cum, rng, confidence=DEFAULT_CONFIDENCE, min_questions=MIN_QUESTIONS):
+    # (posición de la siguiente pregunta, None) o (None, puntuación final) si el test puede parar
+    answered = int((choices != NO_ANSWER).sum())
+    if answered == len(choices): return None, scores
+    if answered >= min_questions:
+        agreement, final = assess(bank, qids, choices, scores, cum, rng)
+        if agreement >= confidence: return None, final
+    return int(np.argmax(influence(bank, qids, choices, scores))), None
+
+# --- REPLAY OFFLINE ---
+def replay_path(bank, qids, path, cum, rng, confidence, min_questions):
+    # Repite un test completo conocido en modo adaptativo: (preguntas hechas, puntuación final)
+    choices = np.full(len(qids), NO_ANSWER, dtype=np.int8)
+    scores = np.zeros(bank.effects.shape[-1], dtype=np.int32)
+    while True:
+        pos, final = next_step(bank, qids, choices, scores, cum, rng, confidence, min_questions)
+        if pos is None: return int((choices != NO_ANSWER).sum()), final
+        choices[pos] = path[pos]
+        scores = score_choices(bank, qids[pos:pos + 1], path[pos:pos + 1], validate=False, initial=scores)[0]
+
+def simulated_paths(bank, qids, n, rng):
+    # Mezcla de estrategias (aleatoria, favorable, desfavorable) para cubrir los tres niveles
+    biases = list(STRATEGIES.values())
+    return np.concatenate([sample_choices(rng, option_probabilities(bank, qids, b), len(part)) for b, part in zip(biases, np.array_split(np.arange(n), len(biases)))])
+
+def stored_paths(store, bank, code, qids):
+    pos = {int(q): i for i, q in enumerate(qids)}
+    out = []
+    for answers in store.answer_paths(bank.ref, code).values():
+        path = np.full(len(qids), NO_ANSWER, dtype=np.int8)
+        for q, letter in answers:
+            if q in pos: path[pos[q]] = OPTION_LETTERS.index(letter)
+        if (path != NO_ANSWER).all(): out.append(path)
+    return np.array(out, dtype=np.int8).reshape(-1, len(qids))
+
+def replay(bank, code, paths, cum, confidence=DEFAULT_CONFIDENCE, min_questions=MIN_QUESTIONS, seed=0):
+    qids = bank.sector_index(code)
+    truth = outcome_codes(score_choices(bank, qids, paths, validate=False))
+    rng = np.random.default_rng(seed)
+    asked = np.zeros(len(paths), dtype=np.int64); predicted = np.zeros(len(paths), dtype=np.int64)
+    for i, path in enumerate(paths):
+        asked[i], final = replay_path(bank, qids, path, cum, rng, confidence, min_questions)
+        predicted[i] = outcome_codes(final)[0]
+    same_level = (truth >> len(FLAG_KEYS)) == (predicted >> len(FLAG_KEYS))
+    same_triggers = (truth & ((1 << len(FLAG_KEYS)) - 1)) == (predicted & ((1 << len(FLAG_KEYS)) - 1))
+    return {
+        "sector": code, "bank_version": bank.ref, "paths": len(paths), "questions": len(qids), "confidence": confidence,
+        "asked_mean": float(asked.mean()) if len(paths) else 0.0, "saved_mean": float(len(qids) - asked.mean()) if len(paths) else 0.0,
+        "agreement_level": float(same_level.mean()) if len(paths) else 0.0,
+        "agreement_triggers": float(same_triggers.mean()) if len(paths) else 0.0,
+        "agreement": float((same_level & same_triggers).mean()) if len(paths) else 0.0,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay del modo adaptativo: preguntas ahorradas y concordancia con el test completo")
+    ap.add_argument("--bank", default="SATE_v1.csv")
+    ap.add_argument("--sector", default="TECH")
+    ap.add_argument("--db", help="repite los tests guardados en esta base (misma versión del banco) en vez de simular")
+    ap.add_argument("--paths", type=int, default=500, help="recorridos simulados")
+    ap.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE)
+    ap.add_argument("--min-questions", type=int, default=MIN_QUESTIONS)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    bank = load_bank(args.bank)
+    code = args.sector.strip().upper()
+    qids = bank.sector_index(code)
+    counts = None
+    if args.db:
+        from results_store import ResultsStore
+        store = ResultsStore(args.db)
+        paths = stored_paths(store, bank, code, qids); counts = store.option_counts(bank.ref)
+    else:
+        paths = simulated_paths(bank, qids, args.paths, np.random.default_rng(args.seed + 1))
+    t = time.perf_counter()
+    r = replay(bank, code, paths, answer_model(bank, qids, counts), args.confidence, args.min_questions, args.seed)
+    elapsed = time.perf_counter() - t
+    print(f"{r['paths']} tests de {code} ({r['bank_version']}) con confianza {r['confidence']:.0%} en {elapsed:.1f}s")
+    print(f"  preguntas: {r['asked_mean']:.1f} de {r['questions']} (ahorro medio {r['saved_mean']:.1f})")
+    print(f"  concordancia: nivel {r['agreement_level']:.1%}  triggers {r['agreement_triggers']:.1%}  ambos {r['agreement']:.1%}")
+
+if __name__ == "__main__":
+    main()
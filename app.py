@@ -1,30 +1,21 @@
 import streamlit as st
-import csv
 import os
 import random
 import string
-import io
-import textwrap
-from datetime import datetime
-import plotly.graph_objects as go
-from PIL import Image
-
-# --- LIBRERÍAS DE ORYON ---
-import pandas as pd
-import numpy as np
-import plotly.express as px
-
-# --- GESTIÓN DE PDF ---
-try:
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.utils import ImageReader
-    PDF_AVAILABLE = True
-except ImportError:
-    PDF_AVAILABLE = False
+import uuid
+
+# --- INSTRUMENTACIÓN ---
+from metrics import start_exporters, timed
+
+# --- CARGA PEREZOSA POR ROL ---
+# La pantalla de login no importa nada más. El motor (numpy, banco, almacén, informes) se carga al
+# entrar un candidato o la entidad; plotly.graph_objects al dibujar el radar y pandas/plotly.express
+# solo en el panel de Oryon. reportlab solo se importa en los workers del pool de PDF (reports.py).
+# Python cachea los módulos por proceso, así que los reruns no vuelven a pagar el import.
 
 # --- 1. CONFIGURACIÓN ---
 st.set_page_config(page_title="Audeo | Oryon Edition", page_icon="🧬", layout="wide")
+start_exporters()
 
 # --- 2. ESTILOS ---
 def inject_style(mode):
@@ -94,27 +85,6 @@ def inject_style(mode):
     st.markdown(f"<style>{base_css}\n{theme_css}</style>", unsafe_allow_html=True)
 
 # --- 3. VARIABLES Y LÓGICA ---
-LABELS_ES = { "achievement": "Necesidad de Logro", "risk_propensity": "Propensión al Riesgo", "innovativeness": "Innovatividad", "locus_control": "Locus de Control Interno", "self_efficacy": "Autoeficacia", "autonomy": "Autonomía", "ambiguity_tolerance": "Tol. Ambigüedad", "emotional_stability": "Estabilidad Emocional" }
-VARIABLE_MAP = {
-    "achievement": "achievement", "logro": "achievement", "pragmatism": "achievement", "focus": "achievement", "discipline": "achievement", "tenacity": "achievement", "persistence": "achievement", "results": "achievement", "efficiency": "achievement", "profit": "achievement", "growth": "achievement", "scale": "achievement", "ambition": "achievement", "cost_saving": "achievement", "financial_focus": "achievement", "valuation": "achievement", "business_acumen": "achievement", "business": "achievement",
-    "risk_propensity": "risk_propensity", "riesgo": "risk_propensity", "risk": "risk_propensity", "courage": "risk_propensity", "audacity": "risk_propensity", "action": "risk_propensity", "speed": "risk_propensity", "investment": "risk_propensity", "debt": "risk_propensity", "financial_risk": "risk_propensity", "boldness": "risk_propensity", "bravery": "risk_propensity", "experimentation": "risk_propensity",
-    "innovativeness": "innovativeness", "innovacion": "innovativeness", "strategy": "innovativeness", "vision": "innovativeness", "creativity": "innovativeness", "adaptability": "innovativeness", "flexibility": "innovativeness", "resourcefulness": "innovativeness", "curiosity": "innovativeness", "open_minded": "innovativeness", "learning": "innovativeness", "differentiation": "innovativeness", "pivot": "innovativeness", "change": "innovativeness", "reframing": "innovativeness", "forward": "innovativeness", "imaginative": "innovativeness",
-    "locus_control": "locus_control", "locus": "locus_control", "responsibility": "locus_control", "ownership": "locus_control", "realism": "locus_control", "accountability": "locus_control", "problem_solving": "locus_control", "decision_making": "locus_control", "internal_locus": "locus_control", "proactivity": "locus_control", "self_awareness": "locus_control", "analysis": "locus_control",
-    "self_efficacy": "self_efficacy", "autoeficacia": "self_efficacy", "confidence": "self_efficacy", "assertiveness": "self_efficacy", "leadership": "self_efficacy", "negotiation": "self_efficacy", "persuasion": "self_efficacy", "influence": "self_efficacy", "sales": "self_efficacy", "communication": "self_efficacy", "management": "self_efficacy", "networking": "self_efficacy", "pricing_power": "self_efficacy", "confrontation": "self_efficacy", "collaboration": "self_efficacy", "team_focus": "self_efficacy", "mentorship": "self_efficacy", "delegation": "self_efficacy",
-    "autonomy": "autonomy", "autonomia": "autonomy", "independence": "autonomy", "freedom": "autonomy", "boundaries": "autonomy", "sovereignty": "autonomy", "identity": "autonomy", "lifestyle": "autonomy", "refusal": "autonomy", "detachment": "autonomy",
-    "ambiguity_tolerance": "ambiguity_tolerance", "tolerancia": "ambiguity_tolerance", "patience": "ambiguity_tolerance", "resilience": "ambiguity_tolerance", "calm": "ambiguity_tolerance", "stoicism": "ambiguity_tolerance", "hope": "ambiguity_tolerance", "optimism": "ambiguity_tolerance", "acceptance": "ambiguity_tolerance", "endurance": "ambiguity_tolerance", "trust": "ambiguity_tolerance",
-    "emotional_stability": "emotional_stability", "estabilidad": "emotional_stability", "integrity": "emotional_stability", "ethics": "emotional_stability", "values": "emotional_stability", "justice": "emotional_stability", "fairness": "emotional_stability", "transparency": "emotional_stability", "honesty": "emotional_stability", "humility": "emotional_stability", "empathy": "emotional_stability", "humanity": "emotional_stability", "culture": "emotional_stability", "loyalty": "emotional_stability", "balance": "emotional_stability", "self_care": "emotional_stability", "coherence": "emotional_stability", "respect": "emotional_stability",
-    "excitable": "excitable", "aggression": "excitable", "violence": "excitable", "anger": "excitable", "conflict": "excitable", "reaction": "excitable", "vengeance": "excitable", "impulsiveness": "excitable", "drama": "excitable",
-    "skeptical": "skeptical", "skepticism": "skeptical", "cynicism": "skeptical", "distrust": "skeptical", "suspicion": "skeptical", "hostility": "skeptical",
-    "cautious": "cautious", "caution": "cautious", "fear": "cautious", "anxiety": "cautious", "avoidance": "cautious", "prudence": "cautious", "security": "cautious", "safety": "cautious", "risk_aversion": "cautious", "conservatism": "cautious", "hesitation": "cautious", "paralysis": "cautious", "trust_risk": "cautious", "delay": "cautious",
-    "reserved": "reserved", "introversion": "reserved", "isolation": "reserved", "secrecy": "reserved", "secretive": "reserved", "distance": "reserved",
-    "passive_aggressive": "passive_aggressive", "resentment": "passive_aggressive", "obstruction": "passive_aggressive", "stubbornness": "passive_aggressive", "resistance": "passive_aggressive",
-    "arrogant": "arrogant", "arrogance": "arrogant", "ego": "arrogant", "narcissism": "arrogant", "superiority": "arrogant", "elitism": "arrogant", "image": "arrogant", "spectacle": "arrogant", "vanity": "arrogant", "bluff": "arrogant", "pride": "arrogant", "class": "arrogant",
-    "mischievous": "mischievous", "cunning": "mischievous", "deceit": "mischievous", "manipulation": "mischievous", "opportunist": "mischievous", "corruption": "mischievous", "exploitation": "mischievous", "greed": "mischievous", "illegal": "mischievous", "machiavellian": "mischievous", "artificial": "mischievous", "tactics": "mischievous",
-    "melodramatic": "melodramatic", "victimism": "melodramatic", "complaint": "melodramatic", "fragility": "melodramatic", "delusion": "melodramatic", "attention_seeking": "melodramatic",
-    "diligent": "diligent", "perfectionism": "diligent", "micromanagement": "diligent", "rigidity": "diligent", "obsession": "diligent", "bureaucracy": "diligent", "complexity": "diligent",
-    "dependent": "dependent", "dependency": "dependent", "submission": "dependent", "pleaser": "dependent", "conformity": "dependent", "obedience": "dependent", "external_validation": "dependent", "reassurance": "dependent", "imitation": "dependent", "external_locus": "dependent", "weakness": "dependent", "surrender": "dependent"
-}
 SECTOR_MAP = {
     "Startup Tecnológica (Scalable)": "TECH", "Consultoría / Servicios Profesionales": "CONSULTORIA",
     "Pequeña y Mediana Empresa (PYME)": "PYME", "Hostelería y Restauración": "HOSTELERIA",
@@ -126,103 +96,148 @@ SECTOR_MAP = {
 def generate_id(): return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
 
 def init_session():
-    if 'octagon' not in st.session_state:
-        st.session_state.octagon = {k: 0 for k in LABELS_ES.keys()}
-        st.session_state.flags = {k: 0 for k in ["excitable", "skeptical", "cautious", "reserved", "passive_aggressive", "arrogant", "mischievous", "melodramatic", "diligent", "dependent"]}
+    if 'scores' not in st.session_state:
+        st.session_state.scores = None  # se crea al elegir sector
         st.session_state.current_step = 0
         st.session_state.finished = False
         st.session_state.started = False
         st.session_state.data_verified = False
         st.session_state.auth = False 
         st.session_state.oryon_auth = False # NUEVA VARIABLE
-        st.session_state.data = []
-        st.session_state.user_id = generate_id()
+        # Estado del test: ref de la versión del banco, sector, paso (current_step), opciones elegidas
+        # (int8, -1 = sin responder) y vector de puntuación. Los textos se leen del banco compartido.
+        st.session_state.bank_ref = None
+        st.session_state.sector_code = None
+        st.session_state.choices = None
+        st.session_state.position = 0  # pregunta en curso (posición en el sector); en modo adaptativo no sigue el orden
+        st.session_state.adaptive = False
+        st.session_state.projection = None  # vector proyectado si el test adaptativo para antes de tiempo
+        st.session_state.saved = False
+        st.session_state.user_id = generate_id()  # código corto que ve el candidato (informe, PDF)
+        st.session_state.result_id = uuid.uuid4().hex  # clave única del resultado en el almacén
         st.session_state.user_data = {}
 
-@st.cache_data
+@timed("load_questions")
 def load_questions():
-    filename = 'SATE_v1.csv'  
-    if not os.path.exists(filename): return []
-    for enc in ['utf-8-sig', 'utf-8', 'latin-1', 'cp1252']:
-        try:
-            with open(filename, encoding=enc, errors='strict') as f:
-                data = list(csv.DictReader(f, delimiter=';'))
-                if data and 'SECTOR' in data[0]: return data
-        except: continue
-    return []
-
-def parse_logic(logic_str):
-    if not logic_str: return
-    for action in logic_str.split('|'):
-        parts = action.strip().split()
-        if len(parts) < 2: continue
-        var_code = parts[0].lower().strip()
-        try: val = int(parts[1])
-        except: continue
-        target = VARIABLE_MAP.get(var_code)
-        if target:
-            if target in st.session_state.octagon: 
-                st.session_state.octagon[target] = max(0, min(100, st.session_state.octagon[target] + val))
-            elif target in st.session_state.flags: 
-                st.session_state.flags[target] = max(0, st.session_state.flags[target] + val)
+    # Banco activo (SAPE_BANK, cambiable desde el panel de Oryon), compilado una vez por versión y
+    # recargado en caliente si cambia el fichero. La sesión se queda con esta versión hasta terminar.
+    from scenario_bank import get_bank
+    return get_bank()
+
+def session_bank():
+    from scenario_bank import bank_by_ref
+    return bank_by_ref(st.session_state.bank_ref)
+
+def expire_session():
+    # La versión del banco de la sesión ya no está en memoria: vuelta a la elección de sector con aviso
+    st.session_state.update(started=False, finished=False, bank_ref=None, scores=None, choices=None, projection=None, current_step=0, position=0, bank_expired=True)
+
+def require_session_bank():
+    # Único punto para una sesión cuya versión del banco ya no se puede resolver (retirada hace más de
+    # RETAIN_SECONDS o nunca registrada): se reinicia el test con aviso y se devuelve None.
+    # Fuera de un callback el llamador debe cortar con st.rerun(); dentro, basta con volver.
+    bank = session_bank()
+    if bank is None: expire_session()
+    return bank
+
+def session_questions(bank): return bank.sector_index(st.session_state.sector_code)
+
+@timed("parse_logic")
+def parse_logic(bank, option):
+    # La lógica de cada opción ya viene pre-parseada en el banco: responder es sumar un vector
+    pos = st.session_state.position
+    bank.apply_option(st.session_state.scores, session_questions(bank)[pos], option)
+    st.session_state.choices[pos] = option
+
+# --- MODO ADAPTATIVO (SAPE_ADAPTIVE=1) ---
+ADAPTIVE = os.environ.get("SAPE_ADAPTIVE", "") == "1"
+ADAPTIVE_CONFIDENCE = float(os.environ.get("SAPE_ADAPTIVE_CONFIDENCE", 0.95))
+
+@st.cache_resource(ttl=3600)
+def answer_model(_bank, bank_ref, code):
+    # Frecuencias de respuesta de los tests guardados con esta versión del banco (se refresca cada hora);
+    # la caché va por bank_ref y el banco llega ya resuelto por quien llama
+    from adaptive import answer_model as build_model
+    bank = _bank
+    return build_model(bank, bank.sector_index(code), get_results_store().option_counts(bank_ref))
+
+@timed("adaptive_step")
+def advance_adaptive(bank):
+    # Siguiente escenario por influencia en el resultado, o fin del test si ya no puede cambiar de nivel/triggers
+    import numpy as np
+    from adaptive import next_step, seed_for
+    rng = np.random.default_rng([seed_for(st.session_state.user_id), st.session_state.current_step])
+    pos, final = next_step(bank, session_questions(bank), st.session_state.choices, st.session_state.scores,
+                           answer_model(bank, bank.ref, st.session_state.sector_code), rng, ADAPTIVE_CONFIDENCE)
+    # Las puntuaciones de la sesión siguen siendo las reales; la proyección solo se usa para informar
+    if pos is None: st.session_state.projection = None if (st.session_state.choices >= 0).all() else final; st.session_state.finished = True
+    else: st.session_state.position = pos
+
+@st.cache_resource
+def get_results_store():
+    from results_store import ResultsStore
+    return ResultsStore()
+
+PAGE_SIZE = 25
+
+def save_results(results):
+    # Se encola una sola vez por sesión; la escritura real la hace el hilo del almacén
+    if st.session_state.saved: return
+    bank = require_session_bank()
+    if bank is None: st.rerun()
+    from results_store import make_record
+    from scoring import calculate_results as score_results
+    st.session_state.norms = sector_norms(results)  # la comparativa queda fijada con la cohorte al terminar
+    projection = st.session_state.projection
+    measured = results if projection is None else score_results(st.session_state.scores)
+    record = make_record(st.session_state.result_id, st.session_state.user_data, st.session_state.sector_code, st.session_state.bank_ref,
+                         st.session_state.scores, measured, session_questions(bank), st.session_state.choices, projection=projection, code=st.session_state.user_id)
+    get_results_store().submit(record); st.session_state.saved = True; st.session_state.finished_at = record["finished_at"]
+
+def sector_norms(results):
+    # Percentiles del candidato frente a su sector, leídos de los sketches del almacén (sin recorrer resultados)
+    from norms import cohort_summary
+    from scenario_bank import octagon_dict
+    ire, avg, friction = results[:3]
+    return cohort_summary(get_results_store().sketches(st.session_state.sector_code), ire, avg, friction, octagon_dict(reported_scores()))
+
+def reported_scores():
+    # Lo que se enseña al candidato: la proyección si el test adaptativo paró antes de tiempo
+    return st.session_state.scores if st.session_state.projection is None else st.session_state.projection
 
+@timed("calculate_results")
 def calculate_results():
-    raw_points = sum(st.session_state.octagon.values())
-    avg = 100 * (1 - (1 / (1 + (raw_points / 150.0))))
-    raw_friction = sum(st.session_state.flags.values())
-    friction = min(100, (raw_friction / 50.0) * 100)
-    penalty_factor = friction / 200.0 
-    ire = avg * (1 - penalty_factor)
-    ire = min(100, max(0, ire))
-    avg = min(100, max(0, avg))
-    triggers = [k for k, v in st.session_state.flags.items() if v > 10]
-    fric_reasons = []
-    if friction > 20: fric_reasons.append("Se detectan patrones de comportamiento limitantes bajo presión.")
-    if "excitable" in triggers: fric_reasons.append("Riesgo de volatilidad emocional o reactividad.")
-    if "cautious" in triggers: fric_reasons.append("Riesgo de parálisis por análisis o aversión al cambio.")
-    if "skeptical" in triggers: fric_reasons.append("Dificultad para confiar y delegar.")
-    if "arrogant" in triggers: fric_reasons.append("Posible exceso de confianza o subestimación de riesgos.")
-    if "mischievous" in triggers: fric_reasons.append("Tendencia a tomar atajos éticos o riesgos imprudentes.")
-    return round(ire, 2), round(avg, 2), round(friction, 2), triggers, fric_reasons, 0
-
-def get_ire_text(s): 
-    if s > 75: return "Nivel de Viabilidad: ALTO (Sostenible)"
-    if s > 50: return "Nivel de Viabilidad: MEDIO (Requiere Ajustes)"
-    return "Nivel de Viabilidad: BAJO (Riesgo Operativo)"
-
-def radar_chart():
-    data = st.session_state.octagon
-    cat = [LABELS_ES.get(k) for k in data.keys()]
-    val = list(data.values())
-    cat += [cat[0]]
-    val += [val[0]]
-    fig = go.Figure(go.Scatterpolar(r=val, theta=cat, fill='toself', line=dict(color='#5D5FEF'), fillcolor='rgba(93, 95, 239, 0.2)'))
-    fig.update_layout(polar=dict(radialaxis=dict(visible=True, showticklabels=False), bgcolor='rgba(0,0,0,0)', tickfont=dict(color='white')), paper_bgcolor='rgba(0,0,0,0)', font=dict(color='white'), showlegend=False, margin=dict(l=40, r=40, t=20, b=20), dragmode=False)
-    return fig
-
-def draw_pdf_header(p, w, h):
-    p.setFillColorRGB(0.02, 0.04, 0.12); p.rect(0, h-100, w, 100, fill=1, stroke=0)
-    p.setFillColorRGB(1, 1, 1); p.rect(30, h-85, 140, 70, fill=1, stroke=0)
-    if os.path.exists("logo_original.png"):
-        try: img = ImageReader("logo_original.png"); p.drawImage(img, 40, h-80, width=120, height=60, preserveAspectRatio=True, mask='auto')
-        except: pass
-    p.setFillColorRGB(1, 1, 1); p.setFont("Helvetica-Bold", 16); p.drawRightString(w-30, h-40, "INFORME TÉCNICO S.A.P.E.")
-    p.setFont("Helvetica", 10); p.drawRightString(w-30, h-55, "Sistema de Análisis de la Personalidad Emprendedora")
-
-def create_pdf_report(ire, avg, friction, triggers, friction_reasons, delta, user, stats):
-    buffer = io.BytesIO(); p = canvas.Canvas(buffer, pagesize=A4); w, h = A4; draw_pdf_header(p, w, h)
-    y = h - 130
-    p.setFillColorRGB(0,0,0); p.setFont("Helvetica-Bold", 10)
-    p.drawString(40, y, f"Candidato: {user.get('name', 'N/A')}"); p.drawString(300, y, f"ID: {st.session_state.user_id}"); y -= 20
-    p.drawString(40, y, f"Sector: {user.get('sector', 'N/A')}"); p.drawString(300, y, f"Fecha: {datetime.now().strftime('%d/%m/%Y')}"); y -= 40
-    p.setFont("Helvetica-Bold", 12); p.drawString(40, y, f"IRE: {ire}/100"); y -= 30
-    p.showPage(); p.save(); buffer.seek(0); return buffer
+    from scoring import calculate_results as score_results
+    return score_results(reported_scores())
 
+@timed("radar_chart")
+def radar_chart(median=None):
+    from charts import radar_figure
+    from scenario_bank import octagon_dict
+    return radar_figure(octagon_dict(reported_scores()), median)
+
+@timed("render_oryon_dashboard")
 def render_oryon_dashboard():
     # 2. PANEL DE CONTROL (YA NO PIDE CONTRASEÑA AQUÍ, LA PIDE EN EL LOGIN GENERAL)
+    import json
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
+    from reports import MAX_PANEL_ZIP, PDF_AVAILABLE, cohort_zip_file, stored_payloads
+    from cohort_io import EXPORT_FORMATS, MAX_PANEL_EXPORT, PARQUET_AVAILABLE, export_file
+    from results_store import GRID_STEP
+    from scenario_bank import LABELS_ES
+    from scoring import IRE_HIGH, IRE_MEDIUM
+    from scoring import calculate_results as score_results
     inject_style("dashboard")
     st.sidebar.markdown("### Configuración")
     logo = st.sidebar.file_uploader("Logo", type=['png', 'jpg'])
+    # Cambiar el banco solo afecta a los candidatos que empiecen a partir de ahora
+    from scenario_bank import BANK_FILES, active_bank_name, get_bank, set_active_bank
+    names = list(BANK_FILES); active = active_bank_name()
+    st.sidebar.selectbox("Banco para nuevos candidatos", names, index=names.index(active) if active in names else 0, key="oryon_bank",
+                         on_change=lambda: set_active_bank(st.session_state.oryon_bank))
+    st.sidebar.caption(f"Versión activa: {get_bank().ref}")
     
     c_logo, c_title = st.columns([1, 5])
     with c_logo:
@@ -233,55 +248,150 @@ def render_oryon_dashboard():
         st.markdown("### Monitorización de Cohorte en Tiempo Real")
     st.divider()
 
-    # 3. DATOS Y GRÁFICOS
-    np.random.seed(42); n_candidatos = 25
-    df = pd.DataFrame({
-        'ID': [f'CND-{i:03d}' for i in range(1, n_candidatos + 1)],
-        'Sector': np.random.choice(['TECH', 'SOCIAL', 'SALUD', 'CONSULTORIA'], n_candidatos),
-        'IRE': np.random.randint(35, 98, n_candidatos),
-        'Potencial': np.random.randint(45, 95, n_candidatos),
-        'Friccion': np.random.randint(5, 75, n_candidatos)
-    })
-
-    k1, k2, k3, k4 = st.columns(4)
-    k1.metric("Candidatos", f"{n_candidatos}")
-    k2.metric("IRE Promedio", f"{int(df['IRE'].mean())}/100")
-    k3.metric("Riesgo Alto", f"{len(df[df['IRE'] < 50])}", delta_color="inverse")
-    k4.metric("Capital Asignable", "450k €")
-    st.divider()
+    # 3. DATOS Y GRÁFICOS (AGREGADOS INCREMENTALES DEL ALMACÉN DE RESULTADOS)
+    store = get_results_store()
+    stats = store.sector_stats()  # agregados: solo tests completos
+    counts = store.sector_counts()  # todos los resultados guardados, también los adaptativos parados antes
+    sel = st.sidebar.selectbox("Sector", ["Todos"] + list(counts.keys()))
+    code = None if sel == "Todos" else sel
+    selected = [s for c, s in stats.items() if code in (None, c)]
+    n_candidatos = sum(s["n"] for s in selected)
+    n_rows = sum(n for c, n in counts.items() if code in (None, c))
+    if not n_rows:
+        st.info("Todavía no hay candidatos finalizados en esta cohorte.")
+    else:
+        if not n_candidatos:
+            st.info(f"Hay {n_rows} test(s) adaptativo(s) parado(s) antes de tiempo y ninguno completo: sus puntuaciones son parciales y no entran en los indicadores ni en la matriz de riesgo.")
+        else:
+            total = lambda key: sum(s[key] for s in selected)
+            k1, k2, k3, k4 = st.columns(4)
+            k1.metric("Candidatos", f"{n_rows}", help=f"{n_candidatos} con el test completo; los indicadores y gráficos usan solo estos" if n_rows > n_candidatos else None)
+            k2.metric("IRE Promedio", f"{int(total('sum_ire') / n_candidatos)}/100")
+            k3.metric("Riesgo Alto", f"{total('high_risk')}", delta_color="inverse")
+            k4.metric("Con Alertas", f"{total('with_triggers')}", delta_color="inverse")
+            st.divider()
+
+            c1, c2 = st.columns([2, 1])
+            with c1:
+                st.subheader("Matriz de Riesgo")
+                grid = pd.DataFrame(store.risk_grid(code), columns=["Sector", "pot_bin", "fric_bin", "Candidatos", "sum_ire"])
+                grid["Potencial"] = (grid["pot_bin"] + 0.5) * GRID_STEP; grid["Friccion"] = (grid["fric_bin"] + 0.5) * GRID_STEP
+                grid["IRE medio"] = (grid["sum_ire"] / grid["Candidatos"]).round(1)
+                fig = px.scatter(grid, x="Potencial", y="Friccion", color="Sector", size="Candidatos", hover_data=["Candidatos", "IRE medio"])
+                fig.add_hrect(y0=60, y1=100, line_width=0, fillcolor="red", opacity=0.1)
+                fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color='white'), height=350)
+                st.plotly_chart(fig, use_container_width=True)
+            with c2:
+                st.subheader("Radar Promedio")
+                fig_r = go.Figure(data=go.Scatterpolar(r=[total(f"sum_{k}") / n_candidatos for k in LABELS_ES], theta=['Logro', 'Riesgo', 'Innov.', 'Locus', 'Autoef.', 'Auton.', 'Ambig.', 'Estab.'], fill='toself'))
+                fig_r.update_layout(polar=dict(radialaxis=dict(visible=True, range=[0, 100], showticklabels=False)), showlegend=False, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color='white'), height=350)
+                st.plotly_chart(fig_r, use_container_width=True)
+
+        st.subheader("Expedientes Detallados")
+        pages = (n_rows - 1) // PAGE_SIZE + 1
+        page = st.number_input(f"Página (de {pages})", 1, pages, 1, key="oryon_page")
+        def table_row(r):
+            # Los adaptativos parados antes de tiempo se enseñan con su proyección, como al candidato y en el PDF
+            if r[-1] is None: return r[:4] + ("Completo",) + r[4:8]
+            ire, avg, friction, triggers = score_results(json.loads(r[-1]))[:4]
+            return r[:4] + (f"Adaptativo ({r[-2]} preg., proyección)", ire, avg, friction, ",".join(triggers))
+        page_rows = store.page((page - 1) * PAGE_SIZE, PAGE_SIZE, code, columns=("code", "finished_at", "name", "sector_code", "ire", "potential", "friction", "triggers", "questions_asked", "projected_scores"))
+        df = pd.DataFrame([table_row(r) for r in page_rows], columns=['ID', 'Fecha', 'Nombre', 'Sector', 'Test', 'IRE', 'Potencial', 'Friccion', 'Alertas'])
+        def color_ire(val):
+            color = '#2ECC71' if val > IRE_HIGH else '#F1C40F' if val > IRE_MEDIUM else '#E74C3C'
+            return f'color: {color}; font-weight: bold;'
+        st.dataframe(df.style.map(color_ire, subset=['IRE']), use_container_width=True, hide_index=True)
+
+        # Reparto de niveles observado frente al simulado por calibration.py con los mismos umbrales
+        with st.expander("Calibración de umbrales (Monte Carlo)"):
+            from calibration import CALIBRATION_FILE, load_calibration
+            from norms import level_shares
+            cal = load_calibration()
+            if cal is None: st.caption(f"Sin calibración: genera {CALIBRATION_FILE} con `python calibration.py --out {CALIBRATION_FILE}`.")
+            else:
+                st.caption(f"Simulación: {cal['bank']} ({cal['version']}), estrategia {cal['strategy']}, {cal['paths_per_sector']:,} recorridos por sector. Niveles: alto > {IRE_HIGH}, medio > {IRE_MEDIUM}.")
+                if (cal["thresholds"]["ire_high"], cal["thresholds"]["ire_medium"]) != (IRE_HIGH, IRE_MEDIUM):
+                    st.warning(f"La calibración se hizo con umbrales {cal['thresholds']['ire_high']}/{cal['thresholds']['ire_medium']}; vuelve a generarla.")
+                rows = []
+                for c in [c for c in stats if code in (None, c)]:
+                    sim = cal["sectors"].get(c); obs = level_shares(store.sketches(c)["ire"], IRE_HIGH, IRE_MEDIUM)
+                    row = {"Sector": c, "Tests completos": stats[c]["n"]}
+                    for level in ("alto", "medio", "bajo"):
+                        row[f"{level.capitalize()} simulado"] = sim["levels"][level] if sim else None
+                        row[f"{level.capitalize()} observado"] = obs[level] if obs else None
+                    rows.append(row)
+                cal_df = pd.DataFrame(rows)
+                st.dataframe(cal_df.style.format({k: "{:.1%}" for k in cal_df.columns[2:]}, na_rep="-"), use_container_width=True, hide_index=True)
+
+    if n_rows and PDF_AVAILABLE:
+        if n_rows > MAX_PANEL_ZIP:
+            st.info(f"Hay {n_rows} informes y el ZIP del panel admite como máximo {MAX_PANEL_ZIP} (SAPE_MAX_PANEL_ZIP). Filtra por sector o genéralo en el servidor: `python reports.py --db {store.path} --out informes.zip{f' --sector {code}' if code else ''}`")
+        else: st.download_button("📦 Descargar informes de la cohorte (ZIP)", lambda: cohort_zip_file(stored_payloads(store, code)), file_name=f"Informes_SAPE_{sel}.zip", mime="application/zip")
+    if n_rows:
+        formats = [f for f in EXPORT_FORMATS if f != "parquet" or PARQUET_AVAILABLE]
+        fmt = st.selectbox("Formato de exportación", formats, format_func=str.upper, key="oryon_export_format")
+        if n_rows > MAX_PANEL_EXPORT:
+            st.info(f"Hay {n_rows} filas y la exportación del panel admite como máximo {MAX_PANEL_EXPORT} (SAPE_MAX_PANEL_EXPORT). Filtra por sector o expórtala en el servidor: `python cohort_io.py export --db {store.path} --format {fmt} --out cohorte.{fmt}{f' --sector {code}' if code else ''}`")
+        else: st.download_button(f"📄 Descargar datos de la cohorte ({fmt.upper()})", lambda: export_file(store, fmt, code), file_name=f"Cohorte_SAPE_{sel}.{fmt}", mime=EXPORT_FORMATS[fmt])
+
+    with st.expander("Importar sesiones en papel"):
+        st.caption("CSV con una fila por candidato: sector_code, datos opcionales (id, name, age, finished_at...) y P1..Pn con la letra elegida, en el orden de las preguntas del sector (todas respondidas). Se puntúan con el banco activo.")
+        sheet = st.file_uploader("Hoja de respuestas", type=["csv"], key="oryon_import")
+        if sheet and st.button("Importar y puntuar"):
+            import io
+            from cohort_io import import_sheet
+            try: report = import_sheet(store, io.TextIOWrapper(sheet, encoding="utf-8-sig", newline=""), get_bank())
+            except (ValueError, UnicodeDecodeError) as e: st.error(f"Hoja no válida: {e}")
+            else:
+                st.success(f"{report['imported']} candidatos importados de {report['rows']} filas ({report['rows_per_s']:,.0f} filas/s) · {report['duplicates']} ya existían · {report['rejected']} rechazadas")
+                if report["errors"]: st.code("\n".join(report["errors"][:200]))
 
-    c1, c2 = st.columns([2, 1])
-    with c1:
-        st.subheader("Matriz de Riesgo")
-        fig = px.scatter(df, x="Potencial", y="Friccion", color="Sector", size="IRE", hover_data=["ID"])
-        fig.add_hrect(y0=60, y1=100, line_width=0, fillcolor="red", opacity=0.1)
-        fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color='white'), height=350)
-        st.plotly_chart(fig, use_container_width=True)
-    with c2:
-        st.subheader("Radar Promedio")
-        fig_r = go.Figure(data=go.Scatterpolar(r=[75, 60, 85, 50, 70, 65, 55, 60], theta=['Logro', 'Riesgo', 'Innov.', 'Locus', 'Autoef.', 'Auton.', 'Ambig.', 'Estab.'], fill='toself'))
-        fig_r.update_layout(polar=dict(radialaxis=dict(visible=True, range=[0, 100]), showticklabels=False), showlegend=False, paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color='white'), height=350)
-        st.plotly_chart(fig_r, use_container_width=True)
-
-    st.subheader("Expedientes Detallados")
-    def color_ire(val):
-        color = '#2ECC71' if val > 75 else '#F1C40F' if val > 50 else '#E74C3C'
-        return f'color: {color}; font-weight: bold;'
-    st.dataframe(df.style.applymap(color_ire, subset=['IRE']), use_container_width=True)
-    
     if st.button("Cerrar Sesión Corporativa"):
         st.session_state.oryon_auth = False
         st.rerun()
 
+@st.cache_resource
+def logo_bytes(*names):
+    # Primer logo existente de la lista, leído una sola vez por proceso
+    for name in names:
+        if os.path.exists(name):
+            with open(name, 'rb') as f: return f.read()
+    return None
+
 def render_header():
     c1, c2 = st.columns([1.5, 6])
     with c1:
-        if os.path.exists("logo_blanco.png"): st.image("logo_blanco.png", use_container_width=True)
-        elif os.path.exists("logo_original.png"): st.image("logo_original.png", use_container_width=True)
+        logo = logo_bytes("logo_blanco.png", "logo_original.png")
+        if logo: st.image(logo, use_container_width=True)
         else: st.warning("Logo no encontrado")
     with c2: st.markdown("""<div style="margin-top: 10px;"><p class="header-title-text">Simulador S.A.P.E.</p><p class="header-sub-text">Sistema de Análisis de la Personalidad Emprendedora</p></div>""", unsafe_allow_html=True)
     st.markdown("---")
 
+def answer(option):
+    bank = require_session_bank()
+    if bank is None: return  # el rerun que sigue al callback ya muestra el aviso
+    parse_logic(bank, option); st.session_state.current_step += 1
+    if st.session_state.adaptive: advance_adaptive(bank)
+    else: st.session_state.position = st.session_state.current_step
+
+@st.fragment
+def question_panel():
+    from scenario_bank import OPTION_LETTERS
+    bank = require_session_bank()
+    if bank is None: st.rerun()
+    n = len(st.session_state.choices)
+    if st.session_state.finished or st.session_state.current_step >= n: st.session_state.finished = True; st.rerun()
+    step = st.session_state.current_step; q = session_questions(bank)[st.session_state.position]; row = bank.rows[q]
+    st.progress((step + 1) / n);
+    st.markdown(f"### {row['TITULO']}")
+    c_text, c_opt = st.columns([1.5, 1])
+    with c_text: st.markdown(f'<div class="diag-text" style="font-size:1.2rem;"><p>{row["NARRATIVA"]}</p></div>', unsafe_allow_html=True)
+    with c_opt:
+        st.markdown("#### Tu decisión:")
+        for opt, letter in enumerate(OPTION_LETTERS):
+            if not bank.available[q, opt]: continue
+            st.button(row.get(f'OPCION_{letter}_TXT', letter), key=f"{letter}_{step}", on_click=answer, args=(opt,), use_container_width=True)
+
 # --- 4. EJECUCIÓN PRINCIPAL (LÓGICA FINAL) ---
 init_session()
 
@@ -311,7 +421,7 @@ elif st.session_state.get('auth', False):
         # AQUÍ ESTABA EL ERROR DE SINTAXIS EN LA V56 - CORREGIDO
         if st.button("VALIDAR DATOS Y CONTINUAR"):
             if name and age and consent:
-                st.session_state.user_data = {"name": name, "age": age, "gender": gender, "sector": "", "experience": experience}
+                st.session_state.user_data = {"name": name, "age": age, "gender": gender, "country": country, "situation": situation, "sector": "", "experience": experience}
                 st.session_state.data_verified = True
                 st.rerun()
             else:
@@ -320,12 +430,21 @@ elif st.session_state.get('auth', False):
     elif not st.session_state.started:
         render_header();
         st.markdown(f"#### 2. Selecciona el Sector del Proyecto:")
+        if st.session_state.pop("bank_expired", False):
+            st.warning("La versión del test con la que empezaste ya no está disponible y tus respuestas no se han podido conservar. Elige de nuevo el sector para empezar.")
+        @timed("go_sector")
         def go_sector(sec):
-            all_q = load_questions();
+            from scenario_bank import new_choices, new_scores
+            bank = load_questions()
+            if not len(bank):  # fichero ausente o ilegible en la primera carga: no hay versión registrada
+                st.error("El banco de escenarios no está disponible en este momento. Avisa a la entidad e inténtalo más tarde."); st.stop()
             code = SECTOR_MAP.get(sec, "TECH")
-            qs = [x for x in all_q if x['SECTOR'].strip().upper() == code]
-            if not qs: qs = [x for x in all_q if x['SECTOR'].strip().upper() == "TECH"]
-            st.session_state.data = qs;
+            if code not in bank.sectors:  # p. ej. SATE_v2 no tiene los sectores de psicología: sin caer en TECH
+                st.error(f"El banco activo ({bank.ref}) no tiene escenarios para «{sec}». Elige otro sector o avisa a la entidad."); st.stop()
+            st.session_state.bank_ref = bank.ref; st.session_state.sector_code = code; st.session_state.current_step = 0; st.session_state.position = 0
+            st.session_state.scores = new_scores(); st.session_state.choices = new_choices(len(bank.sector_index(code))); st.session_state.projection = None
+            st.session_state.adaptive = ADAPTIVE
+            if ADAPTIVE: advance_adaptive(bank)
             st.session_state.user_data["sector"] = sec; st.session_state.started = True; st.rerun()
         
         c1, c2 = st.columns(2)
@@ -343,37 +462,38 @@ elif st.session_state.get('auth', False):
             if st.button("Psicología no sanitaria", use_container_width=True): go_sector("Psicología no sanitaria")
 
     elif not st.session_state.finished:
-        if st.session_state.current_step >= len(st.session_state.data): st.session_state.finished = True; st.rerun()
-        render_header(); row = st.session_state.data[st.session_state.current_step]
-        st.progress((st.session_state.current_step + 1) / len(st.session_state.data));
-        st.markdown(f"### {row['TITULO']}")
-        c_text, c_opt = st.columns([1.5, 1])
-        with c_text: st.markdown(f'<div class="diag-text" style="font-size:1.2rem;"><p>{row["NARRATIVA"]}</p></div>', unsafe_allow_html=True)
-        with c_opt:
-            st.markdown("#### Tu decisión:")
-            step = st.session_state.current_step
-            if st.button(row.get('OPCION_A_TXT', 'A'), key=f"A_{step}", use_container_width=True): parse_logic(row.get('OPCION_A_LOGIC')); st.session_state.current_step += 1; st.rerun()
-            if st.button(row.get('OPCION_B_TXT', 'B'), key=f"B_{step}", use_container_width=True): parse_logic(row.get('OPCION_B_LOGIC')); st.session_state.current_step += 1; st.rerun()
-            if row.get('OPCION_C_TXT') and row.get('OPCION_C_TXT') != "None":
-                if st.button(row.get('OPCION_C_TXT', 'C'), key=f"C_{step}", use_container_width=True): parse_logic(row.get('OPCION_C_LOGIC')); st.session_state.current_step += 1; st.rerun()
-            if row.get('OPCION_D_TXT') and row.get('OPCION_D_TXT') != "None":
-                if st.button(row.get('OPCION_D_TXT', 'D'), key=f"D_{step}", use_container_width=True): parse_logic(row.get('OPCION_D_LOGIC')); st.session_state.current_step += 1; st.rerun()
+        # La cabecera y el CSS solo se envían en las ejecuciones completas; cada respuesta re-ejecuta
+        # únicamente el fragmento de la pregunta (narrativa, opciones y progreso)
+        render_header(); question_panel()
 
     else:
+        from reports import PDF_AVAILABLE, report_payload, submit_report
+        from scenario_bank import flags_dict, octagon_dict
+        from scoring import get_ire_text
         render_header();
-        ire, avg, friction, triggers, fric_reasons, delta = calculate_results()
+        results = calculate_results(); save_results(results)
+        ire, avg, friction, triggers, fric_reasons, delta = results
         st.header(f"Informe S.A.P.E. | {st.session_state.user_data['name']}")
+        n = len(st.session_state.choices)
+        if st.session_state.adaptive and st.session_state.current_step < n:
+            st.caption(f"Test adaptativo: {st.session_state.current_step} de {n} escenarios; el resto no cambiaba el nivel ni las alertas (confianza {ADAPTIVE_CONFIDENCE:.0%}).")
         k1, k2, k3 = st.columns(3);
         k1.metric("Índice IRE", f"{ire}/100"); k2.metric("Potencial", f"{avg}/100"); k3.metric("Fricción", friction, delta_color="inverse")
+        norms = st.session_state.get("norms", {})
+        if "percentiles" in norms:
+            p = norms["percentiles"]
+            st.caption(f"Frente a {norms['n']} candidatos de tu sector: IRE P{p['ire']} · Potencial P{p['potential']} · Fricción P{p['friction']}")
         c_chart, c_desc = st.columns([1, 1])
-        with c_chart: st.plotly_chart(radar_chart(), use_container_width=True)
+        with c_chart: st.plotly_chart(radar_chart(norms.get("median")), use_container_width=True)
         with c_desc:
             st.markdown("### Diagnóstico");
             st.markdown(f'<div class="diag-text"><p>{get_ire_text(ire)}</p></div>', unsafe_allow_html=True)
             if triggers: st.error("Alertas: Se han detectado patrones de riesgo.")
             else: st.success("Perfil sin patrones de riesgo críticos.")
-        pdf = create_pdf_report(ire, avg, friction, triggers, fric_reasons, delta, st.session_state.user_data, st.session_state.octagon)
-        st.download_button("📥 DESCARGAR INFORME COMPLETO (PDF)", pdf, file_name=f"Informe_SAPE_{st.session_state.user_id}.pdf", mime="application/pdf", use_container_width=True)
+        if PDF_AVAILABLE:
+            # El PDF se genera en el pool de informes; los reruns reutilizan el mismo Future (caché por hash)
+            pdf = submit_report(report_payload(st.session_state.user_id, st.session_state.user_data, results, octagon_dict(reported_scores()), flags_dict(reported_scores()), st.session_state.finished_at, norms))
+            st.download_button("📥 DESCARGAR INFORME COMPLETO (PDF)", pdf.result, file_name=f"Informe_SAPE_{st.session_state.user_id}.pdf", mime="application/pdf", use_container_width=True)
         if st.button("Reiniciar"): st.session_state.clear(); st.rerun()
 
 # 3. SI NO HAY SESIÓN -> PANTALLA DE LOGIN UNIFICADA
@@ -383,7 +503,8 @@ else:
     # CABECERA LOGIN
     c1, c2, c3 = st.columns([1, 2, 1])
     with c2:
-        if os.path.exists("logo_original.png"): st.image("logo_original.png", use_container_width=True)
+        logo = logo_bytes("logo_original.png")
+        if logo: st.image(logo, use_container_width=True)
         st.markdown('<p class="login-title">Simulador S.A.P.E.</p>', unsafe_allow_html=True)
         st.markdown('<p class="login-subtitle">Sistema de Análisis de la Personalidad Emprendedora</p>', unsafe_allow_html=True)
         
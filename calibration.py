@@ -0,0 +1,127 @@
+# --- CALIBRACIÓN MONTE CARLO DE UMBRALES (S.A.P.E.) ---
+# Simula millones de recorridos de respuesta por sector (aleatorios o sesgados por estrategia) con el
+# motor vectorizado y resume la distribución de IRE, potencial, fricción y activación de triggers.
+#
+#   python calibration.py --bank SATE_v1.csv --paths 1000000 --strategy aleatoria --out calibration.json
+#
+# Cada proceso del pool puntúa bloques de recorridos y devuelve solo histogramas y contadores, que se
+# suman al final: la memoria no depende del número total de recorridos.
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from scenario_bank import FLAG_KEYS, N_OCTAGON, load_bank
+from scoring import FRICTION_ALERT, IRE_HIGH, IRE_MEDIUM, results_batch, score_choices
+
+# Sesgo de cada estrategia: peso de la opción ~ exp(sesgo * (puntos de octógono - puntos de flags))
+STRATEGIES = {"aleatoria": 0.0, "favorable": 0.1, "desfavorable": -0.1}
+BINS_PER_POINT = 2  # histogramas de 0 a 100 en saltos de 0.5
+N_BINS = 100 * BINS_PER_POINT
+METRICS = ["ire", "potential", "friction"]
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+CHUNK = 100_000
+
+def option_probabilities(bank, qids, bias):
+    # (preguntas x 4) probabilidades acumuladas, solo sobre opciones disponibles
+    effects = bank.effects[qids, :-1].sum(axis=2)
+    net = effects[..., :N_OCTAGON].sum(axis=-1) - effects[..., N_OCTAGON:].sum(axis=-1)
+    weights = np.exp(bias * (net - net.max(axis=1, keepdims=True))) * bank.available[qids]
+    return np.cumsum(weights / weights.sum(axis=1, keepdims=True), axis=1)
+
+def sample_choices(rng, cum, n):
+    u = rng.random((n, cum.shape[0], 1))
+    return np.minimum((u > cum[None, :, :-1]).sum(axis=2), cum.shape[1] - 1).astype(np.int8)
+
+def to_bins(x): return np.minimum((x * BINS_PER_POINT).astype(np.int64), N_BINS - 1)
+
+def simulate_chunk(bank_path, code, n, bias, seed):
+    bank = load_bank(bank_path)
+    qids = bank.sector_index(code)
+    rng = np.random.default_rng(seed)
+    choices = sample_choices(rng, option_probabilities(bank, qids, bias), n)
+    res = results_batch(score_choices(bank, qids, choices, validate=False))
+    out = {m: np.bincount(to_bins(res[m]), minlength=N_BINS) for m in METRICS}
+    out.update({f"{m}_sum": float(res[m].sum()) for m in METRICS})
+    out.update({f"{m}_sumsq": float((res[m] ** 2).sum()) for m in METRICS})
+    out["n"] = n
+    out["triggers"] = res["triggers"].sum(axis=0)
+    out["any_trigger"] = int(res["triggers"].any(axis=1).sum())
+    out["friction_alert"] = int((res["friction"] > FRICTION_ALERT).sum())
+    out["ire_high"] = int((res["ire"] > IRE_HIGH).sum())
+    out["ire_medium"] = int(((res["ire"] > IRE_MEDIUM) & (res["ire"] <= IRE_HIGH)).sum())
+    return code, out
+
+def merge(acc, part):
+    if acc is None: return part
+    for k, v in part.items(): acc[k] = acc[k] + v
+    return acc
+
+def hist_quantiles(hist):
+    cum = np.cumsum(hist) / max(1, hist.sum())
+    return {f"p{int(q * 100):02d}": float(np.searchsorted(cum, q) / BINS_PER_POINT) for q in QUANTILES}
+
+def summarize(acc):
+    n = acc["n"]
+    summary = {"n": int(n)}
+    for m in METRICS:
+        mean = acc[f"{m}_sum"] / n
+        summary[m] = {"mean": round(mean, 3), "std": round(max(0.0, acc[f"{m}_sumsq"] / n - mean ** 2) ** 0.5, 3), **hist_quantiles(acc[m]), "hist": acc[m].tolist()}
+    summary["levels"] = {"alto": acc["ire_high"] / n, "medio": acc["ire_medium"] / n, "bajo": 1 - (acc["ire_high"] + acc["ire_medium"]) / n}
+    summary["friction_alert_rate"] = acc["friction_alert"] / n
+    summary["any_trigger_rate"] = acc["any_trigger"] / n
+    summary["trigger_rate"] = {k: float(c) / n for k, c in zip(FLAG_KEYS, acc["triggers"])}
+    return summary
+
+def run(bank_path, paths, strategy="aleatoria", sectors=None, workers=None, seed=0, chunk=CHUNK):
+    bank = load_bank(bank_path)
+    codes = sectors or [c for c in bank.sectors if c]
+    bias = STRATEGIES[strategy]
+    seeds = np.random.SeedSequence(seed)
+    jobs = []
+    for code in codes:
+        for start in range(0, paths, chunk): jobs.append((code, min(chunk, paths - start)))
+    child_seeds = seeds.spawn(len(jobs))
+    acc = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(simulate_chunk, bank.source, code, n, bias, s) for (code, n), s in zip(jobs, child_seeds)]
+        for f in futures:
+            code, part = f.result()
+            acc[code] = merge(acc.get(code), part)
+    return {
+        "bank": os.path.basename(bank.source), "version": bank.version, "strategy": strategy, "bias": bias,
+        "paths_per_sector": paths, "seed": seed, "bins_per_point": BINS_PER_POINT,
+        "thresholds": {"ire_high": IRE_HIGH, "ire_medium": IRE_MEDIUM, "friction_alert": FRICTION_ALERT},
+        "sectors": {code: summarize(acc[code]) for code in codes},
+    }
+
+CALIBRATION_FILE = os.environ.get("SAPE_CALIBRATION", "calibration.json")  # lo lee el panel de Oryon
+
+def load_calibration(path=CALIBRATION_FILE):
+    if not os.path.exists(path): return None
+    with open(path, encoding="utf-8") as f: return json.load(f)
+
+def main():
+    ap = argparse.ArgumentParser(description="Calibración Monte Carlo de umbrales IRE por sector")
+    ap.add_argument("--bank", default="SATE_v1.csv")
+    ap.add_argument("--paths", type=int, default=1_000_000, help="recorridos simulados por sector")
+    ap.add_argument("--strategy", choices=sorted(STRATEGIES), default="aleatoria")
+    ap.add_argument("--sectors", nargs="*")
+    ap.add_argument("--workers", type=int)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="calibration.json")
+    args = ap.parse_args()
+    t = time.perf_counter()
+    report = run(args.bank, args.paths, args.strategy, args.sectors, args.workers, args.seed)
+    elapsed = time.perf_counter() - t
+    with open(args.out, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, separators=(",", ":"))
+    total = args.paths * len(report["sectors"])
+    print(f"{total:,} recorridos en {elapsed:.1f}s ({total / elapsed:,.0f}/s) -> {args.out}")
+    for code, s in report["sectors"].items():
+        print(f"  {code:<24} IRE p50={s['ire']['p50']:5.1f}  alto={s['levels']['alto']:.1%}  medio={s['levels']['medio']:.1%}  triggers={s['any_trigger_rate']:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+# --- GRÁFICOS (S.A.P.E.) ---
+# Figuras de Plotly que no dependen de Streamlit, para poder medirlas y reutilizarlas fuera de la app.
+from scenario_bank import LABELS_ES
+
+def radar_figure(octagon, median=None):
+    # Octógono del candidato y, si hay normas del sector, su mediana en discontinua
+    import plotly.graph_objects as go
+    cat = [LABELS_ES.get(k) for k in octagon.keys()]
+    val = list(octagon.values())
+    cat += [cat[0]]
+    val += [val[0]]
+    fig = go.Figure(go.Scatterpolar(r=val, theta=cat, fill='toself', name="Candidato/a", line=dict(color='#5D5FEF'), fillcolor='rgba(93, 95, 239, 0.2)'))
+    if median:
+        med = [median[k] for k in octagon] + [median[next(iter(octagon))]]
+        fig.add_trace(go.Scatterpolar(r=med, theta=cat, name="Mediana del sector", line=dict(color='#AAAAAA', dash='dash')))
+    fig.update_layout(polar=dict(radialaxis=dict(visible=True, showticklabels=False), bgcolor='rgba(0,0,0,0)', angularaxis=dict(tickfont=dict(color='white'))), paper_bgcolor='rgba(0,0,0,0)', font=dict(color='white'), showlegend=bool(median), legend=dict(orientation='h'), margin=dict(l=40, r=40, t=20, b=20), dragmode=False)
+    return fig
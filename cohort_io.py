@@ -0,0 +1,281 @@
+# --- EXPORTACIÓN E IMPORTACIÓN DE COHORTES (S.A.P.E.) ---
+# Exportar: CSV (';' y BOM, como los CSV del proyecto), Parquet o Excel, generados por bloques desde
+# ResultsStore.iter_results(): nunca hay un DataFrame de la cohorte en memoria, solo un bloque de filas
+# (en Parquet, un row group por bloque). El .xlsx se escribe directamente (zip + XML de la hoja en
+# streaming), así que no hace falta openpyxl.
+# Importar: hojas de respuestas de sesiones en papel, una fila por candidato con sector_code, los datos
+# opcionales del candidato (mismas columnas que la exportación) y P1..Pn en el orden de las preguntas
+# del sector en el banco. Se validan y puntúan por lotes con score_choices(); las filas con códigos de
+# opción no válidos, preguntas sin responder (un test en papel parcial no debe entrar en los agregados
+# ni en las normas), opciones inexistentes, lógica mal formada en el banco o un id repetido en la hoja
+# se rechazan con su línea. Un id que ya está en la base cuenta como duplicado y no se toca.
+#
+#   python cohort_io.py export --db resultados.db --format parquet --out cohorte.parquet [--sector TECH]
+#   python cohort_io.py import hojas.csv --db resultados.db [--bank SATE_v1] [--dry-run]
+import argparse
+import csv
+import importlib.util
+import io
+import itertools
+import os
+import random
+import re
+import string
+import sys
+import tempfile
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from reports import ChunkSink
+from results_store import RESULT_COLUMNS, RESULTS_DB, USER_FIELDS, ResultsStore, make_record
+from scenario_bank import DIMENSIONS, NO_ANSWER, OPTION_LETTERS, get_bank, logic_errors
+from scoring import results_batch, score_choices, sector_questions, trigger_names
+
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+EXPORT_BATCH = 2000
+IMPORT_BATCH = 2000
+XLSX_MAX_ROWS = 1_048_576
+# Como el ZIP de informes, la exportación del panel de Oryon se genera entera y Streamlit la retiene en
+# memoria hasta que se descarga (~220 bytes por fila en CSV): por encima, solo por línea de comandos
+MAX_PANEL_EXPORT = int(os.environ.get("SAPE_MAX_PANEL_EXPORT", 50_000))
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+INT_COLUMNS = {"age", "questions_asked", *DIMENSIONS}
+FLOAT_COLUMNS = {"ire", "potential", "friction"}
+
+def chunks(rows, size):
+    it = iter(rows)
+    while chunk := list(itertools.islice(it, size)): yield chunk
+
+# --- EXPORTACIÓN POR BLOQUES ---
+def iter_csv(rows, columns=RESULT_COLUMNS, batch=EXPORT_BATCH):
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=';')
+    writer.writerow(columns)
+    encoding = "utf-8-sig"  # BOM solo en el primer trozo
+    for chunk in chunks(rows, batch):
+        writer.writerows([r.get(c) for c in columns] for r in chunk)
+        yield buf.getvalue().encode(encoding); encoding = "utf-8"
+        buf.seek(0); buf.truncate()
+    if buf.tell(): yield buf.getvalue().encode(encoding)
+
+def iter_parquet(rows, columns=RESULT_COLUMNS, batch=EXPORT_BATCH):
+    if not PARQUET_AVAILABLE: raise RuntimeError("La exportación a Parquet necesita pyarrow (pip install pyarrow)")
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(c, pa.int64() if c in INT_COLUMNS else pa.float64() if c in FLOAT_COLUMNS else pa.string()) for c in columns])
+    sink = ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks(rows, batch):
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG = "http://schemas.openxmlformats.org/package/2006/relationships"
+XLSX_PARTS = {
+    "[Content_Types].xml": '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/><Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/></Types>',
+    "_rels/.rels": f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{NS_PKG}"><Relationship Id="rId1" Type="{NS_REL}/officeDocument" Target="xl/workbook.xml"/></Relationships>',
+    "xl/workbook.xml": f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_REL}"><sheets><sheet name="Resultados" sheetId="1" r:id="rId1"/></sheets></workbook>',
+    "xl/_rels/workbook.xml.rels": f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{NS_PKG}"><Relationship Id="rId1" Type="{NS_REL}/worksheet" Target="worksheets/sheet1.xml"/></Relationships>',
+}
+SHEET_HEAD = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="{NS_MAIN}"><sheetViews><sheetView workbookViewId="0">'
+              '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView></sheetViews><sheetData>')
+SHEET_TAIL = "</sheetData></worksheet>"
+
+def xlsx_cell(v):
+    if v is None: return "<c/>"
+    if isinstance(v, (int, float)) and not isinstance(v, bool): return f"<c><v>{v!r}</v></c>"
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(XML_INVALID.sub("", str(v)))}</t></is></c>'
+
+def xlsx_row(values): return "<row>" + "".join(xlsx_cell(v) for v in values) + "</row>"
+
+def iter_xlsx(rows, columns=RESULT_COLUMNS, batch=EXPORT_BATCH):
+    # Cadenas en línea (sin sharedStrings, que obligaría a tener todas en memoria hasta el final)
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in XLSX_PARTS.items(): zf.writestr(name, xml)
+        with zf.open("xl/worksheets/sheet1.xml", 'w') as f:
+            f.write((SHEET_HEAD + xlsx_row(columns)).encode("utf-8"))
+            for chunk in chunks(rows, batch):
+                f.write("".join(xlsx_row([r.get(c) for c in columns]) for r in chunk).encode("utf-8"))
+                yield sink.drain()
+            f.write(SHEET_TAIL.encode("utf-8"))
+    yield sink.drain()
+
+WRITERS = {"csv": iter_csv, "parquet": iter_parquet, "xlsx": iter_xlsx}
+
+def iter_export(store, fmt, sector_code=None, batch=EXPORT_BATCH):
+    if fmt not in WRITERS: raise ValueError(f"Formato desconocido: {fmt!r} (disponibles: {', '.join(WRITERS)})")
+    if fmt == "xlsx" and store.count(sector_code) >= XLSX_MAX_ROWS: raise ValueError(f"Excel admite como máximo {XLSX_MAX_ROWS - 1} filas: exporta en CSV o Parquet")
+    return WRITERS[fmt](store.iter_results(sector_code, batch), batch=batch)
+
+def export_file(store, fmt, sector_code=None):
+    # Fichero temporal (en disco a partir de 32 MB) listo para st.download_button; el panel solo lo pide
+    # para cohortes de hasta MAX_PANEL_EXPORT filas
+    f = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024)
+    for chunk in iter_export(store, fmt, sector_code): f.write(chunk)
+    f.seek(0)
+    return f
+
+# --- IMPORTACIÓN DE HOJAS DE RESPUESTAS ---
+SHEET_FIELDS = ["id", "finished_at"] + USER_FIELDS + ["sector_code"]
+ANSWER_COLUMN = re.compile(r"P(\d+)", re.IGNORECASE)
+
+def read_header(header):
+    # -> ({campo: columna}, [columna de P1, P2, ...])
+    names = [h.strip() for h in header]
+    fields = {n.lower(): i for i, n in enumerate(names) if n.lower() in SHEET_FIELDS}
+    if "sector_code" not in fields: raise ValueError("Cabecera: falta la columna sector_code")
+    answers = {int(m.group(1)): i for i, n in enumerate(names) if (m := ANSWER_COLUMN.fullmatch(n))}
+    missing = [f"P{k}" for k in range(1, max(answers, default=0) + 1) if k not in answers]
+    if not answers or missing: raise ValueError(f"Cabecera: faltan columnas de respuesta ({', '.join(missing) or 'P1...'})")
+    return fields, [answers[k] for k in sorted(answers)]
+
+def read_sheet(f):
+    # -> (línea, {campo: texto}, [respuesta en texto por pregunta]) por fila no vacía
+    first = f.readline()
+    delimiter = max(";,\t", key=first.count)
+    fields, answer_cols = read_header(next(csv.reader([first], delimiter=delimiter)))
+    reader = csv.reader(f, delimiter=delimiter)
+    for values in reader:
+        if not any(v.strip() for v in values): continue
+        row = {name: values[i].strip() for name, i in fields.items() if i < len(values)}
+        yield reader.line_num + 1, row, [values[i] if i < len(values) else "" for i in answer_cols]
+
+def bank_logic_errors(bank):
+    # {(fila del banco, opción): primera acción mal formada} para las opciones que se pueden elegir
+    return {(q, o): bad[0] for q, row in enumerate(bank.rows) for o, letter in enumerate(OPTION_LETTERS)
+            if bank.available[q, o] and (bad := logic_errors(row.get(f'OPCION_{letter}_LOGIC')))}
+
+def new_code(): return "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
+
+ANSWER_CODES = {"": NO_ANSWER, "-": NO_ANSWER, **{letter: o for o, letter in enumerate(OPTION_LETTERS)}}
+INVALID = NO_ANSWER - 1
+
+def parse_row(bank, row):
+    # -> (sector, preguntas, datos del candidato, id de la hoja o None, fecha); ValueError con el motivo
+    code, qids = sector_questions(bank, row.get("sector_code"))
+    user = {f: row.get(f) or None for f in USER_FIELDS}
+    if user["age"] is not None:
+        if not user["age"].isdigit(): raise ValueError(f"edad {user['age']!r} no válida")
+        user["age"] = int(user["age"])
+    finished_at = row.get("finished_at") or None
+    if finished_at:
+        try: finished_at = datetime.fromisoformat(finished_at).isoformat(timespec="seconds")
+        except ValueError: raise ValueError(f"fecha {finished_at!r} no válida (formato ISO, p. ej. 2026-01-19T12:45:00)") from None
+    return code, qids, user, row.get("id") or None, finished_at
+
+def answer_error(code, qids, answers, codes, missing, malformed, bad_logic):
+    # Motivo de rechazo de una fila (la primera respuesta con problemas)
+    n = len(qids)
+    for col in np.flatnonzero(codes == INVALID): return f"Respuesta {col + 1}: opción {answers[col].strip()!r} no válida"
+    if (codes[n:] != NO_ANSWER).any(): return f"{int((codes != NO_ANSWER).sum())} respuestas para {code}, que tiene {n} preguntas"
+    blank = np.flatnonzero(codes[:n] == NO_ANSWER)
+    if len(blank): return f"{len(blank)} pregunta(s) sin responder (la primera, {blank[0] + 1}): el test debe estar completo"
+    col = int(np.argmax(missing | malformed)); q = int(qids[col]); o = int(codes[col])
+    if missing[col]: return f"la opción {OPTION_LETTERS[o]} no existe en la pregunta {col + 1}"
+    return f"la opción {OPTION_LETTERS[o]} de la pregunta {col + 1} tiene lógica mal formada en el banco (fila {q + 2}: {bad_logic[q, o]!r})"
+
+def score_block(bank, block, bad_logic, seen_ids=None):
+    # Valida y puntúa un bloque de filas agrupadas por sector, todo vectorizado: -> (registros, errores).
+    # `seen_ids` ({id: línea}) se comparte entre bloques para rechazar ids repetidos en la misma hoja.
+    groups = {}; errors = []
+    seen_ids = {} if seen_ids is None else seen_ids
+    for line, row, answers in block:
+        try: code, qids, user, result_id, finished_at = parse_row(bank, row)
+        except ValueError as e: errors.append((line, str(e))); continue
+        if result_id is not None:
+            if result_id in seen_ids: errors.append((line, f"id {result_id!r} repetido (ya en la línea {seen_ids[result_id]})")); continue
+            seen_ids[result_id] = line
+        groups.setdefault(code, (qids, []))[1].append((line, answers, user, result_id, finished_at))
+    records = []
+    for code, (qids, items) in groups.items():
+        n = len(qids); width = len(items[0][1])
+        codes = np.full((len(items), max(width, n)), NO_ANSWER, dtype=np.int8)
+        codes[:, :width] = [[ANSWER_CODES.get(a.strip().upper(), INVALID) for a in it[1]] for it in items]
+        choices = codes[:, :n]
+        answered = choices >= 0
+        picked = np.where(answered, choices, 0)
+        missing = ~bank.available[qids[None, :], picked] & answered
+        malformed = np.zeros_like(missing)
+        for q, o in bad_logic: malformed |= (qids[None, :] == q) & (picked == o) & answered
+        good = ~((codes == INVALID).any(axis=1) | (codes[:, n:] != NO_ANSWER).any(axis=1) | ~answered.all(axis=1) | (missing | malformed).any(axis=1))
+        for i in np.flatnonzero(~good):
+            errors.append((items[i][0], answer_error(code, qids, items[i][1], codes[i], missing[i], malformed[i], bad_logic)))
+        if not good.any(): continue
+        choices = choices[good]
+        scores = score_choices(bank, qids, choices, validate=False)
+        res = results_batch(scores)
+        ire, potential, friction = res["ire"].tolist(), res["potential"].tolist(), res["friction"].tolist()
+        q_list = qids.tolist()
+        for j, (line, _, user, result_id, finished_at) in enumerate(it for it, ok in zip(items, good) if ok):
+            results = (round(ire[j], 2), round(potential[j], 2), round(friction[j], 2), trigger_names(res["triggers"][j]))
+            # El id de la hoja es la clave (reimportar la misma hoja no duplica); sin id, uno único y un código corto
+            key, short = (result_id, result_id) if result_id else (uuid.uuid4().hex, new_code())
+            records.append(make_record(key, user, code, bank.ref, scores[j].tolist(), results, q_list, choices[j].tolist(), finished_at, code=short))
+    return records, sorted(errors)
+
+def import_sheet(store, f, bank, batch=IMPORT_BATCH, dry_run=False):
+    # Lee, valida, puntúa y guarda por bloques; los reenvíos (mismo id) se ignoran como en la app
+    t = time.perf_counter()
+    bad_logic = bank_logic_errors(bank)
+    rows = valid = imported = 0; errors = []; seen_ids = {}
+    for block in chunks(read_sheet(f), batch):
+        records, block_errors = score_block(bank, block, bad_logic, seen_ids)
+        rows += len(block); valid += len(records); errors += block_errors
+        if records and not dry_run: imported += store.write_batch(records)
+    elapsed = time.perf_counter() - t
+    return {
+        "bank_version": bank.ref, "rows": rows, "valid": valid, "imported": imported, "duplicates": 0 if dry_run else valid - imported,
+        "rejected": len(errors), "errors": [f"Línea {line}: {msg}" for line, msg in errors],
+        "seconds": elapsed, "rows_per_s": rows / elapsed if elapsed else 0.0,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Exporta la cohorte (CSV/Parquet/Excel) o importa hojas de respuestas en papel")
+    sub = ap.add_subparsers(dest="command", required=True)
+    ex = sub.add_parser("export", help="exporta los resultados guardados por bloques")
+    ex.add_argument("--db", default=RESULTS_DB)
+    ex.add_argument("--sector")
+    ex.add_argument("--format", choices=list(WRITERS), default="csv")
+    ex.add_argument("--out")
+    ex.add_argument("--batch", type=int, default=EXPORT_BATCH)
+    im = sub.add_parser("import", help="puntúa y guarda una hoja de respuestas (CSV)")
+    im.add_argument("sheet")
+    im.add_argument("--db", default=RESULTS_DB)
+    im.add_argument("--bank", help="banco del registro (por defecto, el activo)")
+    im.add_argument("--batch", type=int, default=IMPORT_BATCH)
+    im.add_argument("--dry-run", action="store_true", help="solo valida y puntúa, sin guardar")
+    im.add_argument("--max-errors", type=int, default=50, help="errores que se muestran")
+    args = ap.parse_args()
+    store = ResultsStore(args.db)
+    if args.command == "export":
+        out = args.out or f"cohorte.{args.format}"
+        t = time.perf_counter(); size = 0
+        with open(out, 'wb') as f:
+            for chunk in iter_export(store, args.format, args.sector, args.batch): f.write(chunk); size += len(chunk)
+        print(f"{out}: {store.count(args.sector)} resultados, {size / 1e6:.1f} MB en {time.perf_counter() - t:.1f}s")
+        return
+    with open(args.sheet, encoding="utf-8-sig", newline="") as f: r = import_sheet(store, f, get_bank(args.bank), args.batch, args.dry_run)
+    print(f"{args.sheet} ({r['bank_version']}): {r['rows']} filas en {r['seconds']:.1f}s ({r['rows_per_s']:,.0f} filas/s)")
+    print(f"  válidas {r['valid']}  importadas {r['imported']}  duplicadas {r['duplicates']}  rechazadas {r['rejected']}{'  (sin guardar: --dry-run)' if args.dry_run else ''}")
+    for e in r["errors"][:args.max_errors]: print(f"  {e}", file=sys.stderr)
+    if r["rejected"] > args.max_errors: print(f"  ... y {r['rejected'] - args.max_errors} más", file=sys.stderr)
+    sys.exit(1 if r["rejected"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# --- PRUEBA DE CARGA SIN NAVEGADOR (S.A.P.E.) ---
+# Simula N candidatos completos (login -> datos -> sector -> respuestas -> informe) con AppTest de
+# Streamlit, repartidos en varios procesos que actúan como servidores independientes contra la misma
+# base de resultados. Informa del throughput y de p50/p95/p99 por fase, más los histogramas de los
+# spans instrumentados en la app.
+#
+#   python loadtest.py --candidates 40 --concurrency 4 [--metrics-out loadtest.prom]
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+PHASES = ["login", "datos", "sector", "respuesta", "informe"]
+
+def click(at, label=None, key=None):
+    button = next(b for b in at.button if (label is None or b.label == label) and (key is None or b.key == key))
+    button.click()
+    t = time.perf_counter(); at.run(); return time.perf_counter() - t
+
+def drive_candidate(rng, password):
+    from streamlit.testing.v1 import AppTest
+    from reports import wait_reports
+    timings = {p: [] for p in PHASES}
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.run()
+    at.text_input(key="pwd_cand").input(password)
+    timings["login"].append(click(at, "ACCESO EMPRENDEDOR"))
+    at.text_input(key="name_input").input(f"Carga {rng.randrange(10**6)}"); at.checkbox[0].check()
+    timings["datos"].append(click(at, "VALIDAR DATOS Y CONTINUAR"))
+    sectors = [b for b in at.button]
+    rng.choice(sectors).click()
+    t = time.perf_counter(); at.run(); timings["sector"].append(time.perf_counter() - t)
+    while True:
+        options = [b for b in at.button if b.key and b.key[:2] in ("A_", "B_", "C_", "D_")]
+        if not options: break
+        rng.choice(options).click()
+        t = time.perf_counter(); at.run(); elapsed = time.perf_counter() - t
+        options_left = any(b.key and b.key[:2] in ("A_", "B_", "C_", "D_") for b in at.button)
+        if options_left: timings["respuesta"].append(elapsed)
+        else:
+            # Última respuesta: incluye el paso a resultados y la generación del PDF en el pool
+            wait_reports(); timings["informe"].append(time.perf_counter() - t)
+    if at.exception: raise RuntimeError(at.exception[0].value)
+    return timings
+
+def run_worker(n, seed, password):
+    import metrics, reports, results_store
+    rng = random.Random(seed)
+    timings = {p: [] for p in PHASES}
+    try:
+        for _ in range(n):
+            for p, values in drive_candidate(rng, password).items(): timings[p].extend(values)
+    finally:
+        reports.shutdown_pool(); results_store.close_all()
+    return timings, metrics.snapshot()
+
+def percentile(values, q):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def main():
+    ap = argparse.ArgumentParser(description="Prueba de carga headless del simulador")
+    ap.add_argument("--candidates", type=int, default=20)
+    ap.add_argument("--concurrency", type=int, default=os.cpu_count())
+    ap.add_argument("--password", default="admin")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--db", help="base de resultados (por defecto, una temporal)")
+    ap.add_argument("--metrics-out", help="fichero de texto Prometheus con los spans de la app")
+    args = ap.parse_args()
+    os.environ["SAPE_RESULTS_DB"] = args.db or os.path.join(tempfile.mkdtemp(prefix="sape_load_"), "resultados.db")
+
+    import metrics
+    shares = [args.candidates // args.concurrency + (i < args.candidates % args.concurrency) for i in range(args.concurrency)]
+    timings = {p: [] for p in PHASES}
+    hists = {}
+    t = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(run_worker, n, args.seed + i, args.password) for i, n in enumerate(shares) if n]
+        for f in futures:
+            part, snap = f.result()
+            for p, values in part.items(): timings[p].extend(values)
+            for name, h in snap.items():
+                if name in hists: hists[name].merge(h)
+                else: hists[name] = h
+    wall = time.perf_counter() - t
+
+    print(f"{args.candidates} candidatos, {args.concurrency} procesos, {wall:.1f}s -> {args.candidates / wall:.2f} candidatos/s")
+    print(f"{'fase':<12}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for p in PHASES:
+        v = timings[p]
+        print(f"{p:<12}{len(v):>7}{percentile(v, .5) * 1e3:>10.1f}{percentile(v, .95) * 1e3:>10.1f}{percentile(v, .99) * 1e3:>10.1f}")
+    print(f"\n{'span':<26}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in sorted(hists):
+        h = hists[name]
+        print(f"{name:<26}{h.count:>7}{h.quantile(.5) * 1e3:>10.2f}{h.quantile(.95) * 1e3:>10.2f}{h.quantile(.99) * 1e3:>10.2f}")
+    if args.metrics_out:
+        with open(args.metrics_out, "w", encoding="utf-8") as f: f.write(metrics.render_prometheus(hists))
+
+if __name__ == "__main__":
+    main()
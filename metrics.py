@@ -0,0 +1,127 @@
+# --- INSTRUMENTACIÓN DE RUTAS CALIENTES ---
+# Histogramas de latencia por span (buckets fijos, formato de texto de Prometheus). Se exportan a
+# fichero si SAPE_METRICS_FILE está definido (admite {pid} para un fichero por proceso) y/o por HTTP
+# en localhost:SAPE_METRICS_PORT/metrics.
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_NAME = "sape_span_seconds"
+EXPORT_INTERVAL = 10
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(BUCKETS) and seconds > BUCKETS[i]: i += 1
+        self.counts[i] += 1; self.count += 1; self.sum += seconds
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts): self.counts[i] += c
+        self.count += other.count; self.sum += other.sum
+
+    def quantile(self, q):
+        # Estimación por interpolación lineal dentro del bucket (como histogram_quantile de Prometheus)
+        if not self.count: return 0.0
+        rank = q * self.count; seen = 0
+        for i, c in enumerate(self.counts):
+            if seen + c >= rank and c:
+                lo = BUCKETS[i - 1] if i else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return BUCKETS[-1]
+
+_hists = {}
+_lock = threading.Lock()
+
+def observe(name, seconds):
+    with _lock:
+        h = _hists.get(name)
+        if h is None: h = _hists[name] = Histogram()
+        h.observe(seconds)
+
+@contextmanager
+def span(name):
+    # Se registra también si el bloque sale con excepción (p. ej. st.rerun())
+    t = time.perf_counter()
+    try: yield
+    finally: observe(name, time.perf_counter() - t)
+
+def timed(name):
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name): return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def observe_future(name, future):
+    # Latencia de trabajos en pools de procesos: desde el envío hasta que el resultado está listo
+    t = time.perf_counter()
+    future.add_done_callback(lambda _: observe(name, time.perf_counter() - t))
+    return future
+
+def snapshot():
+    with _lock:
+        out = {}
+        for name, h in _hists.items():
+            c = Histogram(); c.merge(h); out[name] = c
+        return out
+
+def render_prometheus(hists=None):
+    hists = snapshot() if hists is None else hists
+    lines = [f"# HELP {METRIC_NAME} Duración de las rutas calientes del simulador S.A.P.E.", f"# TYPE {METRIC_NAME} histogram"]
+    for name in sorted(hists):
+        h = hists[name]; acc = 0
+        for le, c in zip(BUCKETS + ("+Inf",), h.counts):
+            acc += c
+            lines.append(f'{METRIC_NAME}_bucket{{span="{name}",le="{le}"}} {acc}')
+        lines.append(f'{METRIC_NAME}_sum{{span="{name}"}} {h.sum:.6f}')
+        lines.append(f'{METRIC_NAME}_count{{span="{name}"}} {h.count}')
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path):
+    path = path.format(pid=os.getpid())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f: f.write(render_prometheus())
+    os.replace(tmp, path)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics": self.send_error(404); return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers(); self.wfile.write(body)
+
+    def log_message(self, *args): pass
+
+_exporters_started = False
+
+def start_exporters(path=None, port=None):
+    # Idempotente: se puede llamar en cada rerun de Streamlit
+    global _exporters_started
+    path = path or os.environ.get("SAPE_METRICS_FILE")
+    port = port or os.environ.get("SAPE_METRICS_PORT")
+    with _lock:
+        if _exporters_started: return
+        _exporters_started = True
+    if path:
+        def loop():
+            while True:
+                time.sleep(EXPORT_INTERVAL); write_prometheus(path)
+        threading.Thread(target=loop, name="metrics-file", daemon=True).start()
+    if port:
+        try: server = ThreadingHTTPServer(("127.0.0.1", int(port)), _MetricsHandler)
+        except OSError: return  # otro proceso del servidor ya escucha en ese puerto
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
@@ -0,0 +1,287 @@
+# --- MICRO-BENCHMARKS DEL MOTOR DE PUNTUACIÓN E INFORMES (S.A.P.E.) ---
+# Sin servidor de Streamlit: carga y compilación del banco con cada codificación de la cascada de
+# decode_rows(), parse_logic() sobre todas las opciones, aplicación de respuestas (una a una como la
+# app y por lotes), cálculo de resultados, radar (construcción y serialización a JSON, que es lo que
+# hace st.plotly_chart) y PDF. Se mide con los CSV del proyecto y con bancos sintéticos 10x mayores.
+#
+#   python micro_bench.py run --out bench.json
+#   python micro_bench.py run --baseline bench.json --threshold 0.2     (sale con 1 si hay regresión)
+#   python micro_bench.py compare bench.json nuevo.json --threshold 0.2
+#   python micro_bench.py check --paths 2000                           (sale con 1 si hay diferencias)
+#
+# `check` (y `run`, salvo --no-check) comprueba antes que el motor vectorizado puntúa igual que la
+# aplicación original, respuesta a respuesta, sobre recorridos aleatorios.
+# Cada caso se repite con un número de iteraciones calibrado (gc desactivado, como timeit) y se guarda
+# el mínimo y la mediana por operación; la comparación usa el mínimo, que es lo más estable entre runs.
+import argparse
+import csv
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from calibration import STRATEGIES, option_probabilities, sample_choices
+from scenario_bank import DEFAULT_SECTOR, ENCODINGS, N_DIMS, N_OCTAGON, NO_ANSWER, OPTION_LETTERS, SCORE_DTYPE, VARIABLE_MAP, ScenarioBank, decode_rows, flags_dict, load_bank, new_scores, octagon_dict, parse_logic
+from scoring import calculate_results, results_batch, score_choices
+
+BANKS = ["SATE_v1.csv", "SATE_v2.csv"]
+SCALE = 10  # bancos sintéticos: cada sector con SCALE veces sus preguntas
+BATCH = 1000
+MIN_TIME = 0.5  # segundos por caso (repartidos entre las repeticiones)
+REPEAT = 5
+CHECK_PATHS = 200  # recorridos por sector y estrategia en la comprobación de equivalencia
+
+def timeit(fn, min_time=MIN_TIME, repeat=REPEAT):
+    # Calibra el número de llamadas por muestra para que cada una dure ~min_time / repeat
+    target = min_time / repeat
+    number = 1
+    gc_was = gc.isenabled(); gc.disable()
+    try:
+        while True:
+            t = time.perf_counter()
+            for _ in range(number): fn()
+            elapsed = time.perf_counter() - t
+            if elapsed >= target: break
+            number = max(number * 2, int(number * target / max(elapsed, 1e-9) * 1.2))
+        samples = [elapsed]
+        for _ in range(repeat - 1):
+            t = time.perf_counter()
+            for _ in range(number): fn()
+            samples.append(time.perf_counter() - t)
+    finally:
+        if gc_was: gc.enable()
+    return {"min_us": min(samples) / number * 1e6, "median_us": statistics.median(samples) / number * 1e6, "number": number, "repeat": repeat}
+
+# --- BANCOS DE PRUEBA ---
+def bank_text(bank):
+    with open(bank.source, 'rb') as f: return f.read().decode(bank.encoding)
+
+def scaled_text(text, scale):
+    # Las mismas filas `scale` veces: cada sector pasa a tener `scale` veces sus preguntas
+    rows = list(csv.DictReader(io.StringIO(text), delimiter=';'))
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]), delimiter=';', lineterminator='\n')
+    writer.writeheader()
+    for _ in range(scale): writer.writerows(rows)
+    return out.getvalue()
+
+def encoded(text, encoding):
+    # Bytes del banco en esa codificación; lo que no cabe (p. ej. '€' en latin-1) se sustituye
+    return text.encode(encoding, errors="replace")
+
+def random_logic_text(text, rng, max_actions=6, max_value=60):
+    # Mismo banco con lógicas aleatorias: signos mezclados y dimensiones repetidas en una misma opción,
+    # que es donde el recorte tras cada acción no conmuta con la suma (varias etapas por opción)
+    rows = list(csv.DictReader(io.StringIO(text), delimiter=';'))
+    names = sorted(VARIABLE_MAP)
+    for row in rows:
+        for letter in OPTION_LETTERS:
+            if not row.get(f'OPCION_{letter}_TXT'): continue
+            actions = [f"{names[rng.integers(len(names))]} {int(rng.integers(-max_value, max_value + 1))}" for _ in range(rng.integers(1, max_actions + 1))]
+            row[f'OPCION_{letter}_LOGIC'] = " | ".join(actions)
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]), delimiter=';', lineterminator='\n')
+    writer.writeheader(); writer.writerows(rows)
+    return out.getvalue()
+
+# --- EQUIVALENCIA CON LA PUNTUACIÓN PREGUNTA A PREGUNTA ---
+def reference_scores(bank, qids, path):
+    # Como la app original: cada acción de la lógica se suma y se recorta al momento (octógono 0-100, flags >= 0)
+    scores = [0] * N_DIMS
+    for q, o in zip(qids, path):
+        if o == NO_ANSWER: continue
+        for dim, val in parse_logic(bank.rows[q].get(f'OPCION_{OPTION_LETTERS[o]}_LOGIC')):
+            scores[dim] = max(0, min(100, scores[dim] + val)) if dim < N_OCTAGON else max(0, scores[dim] + val)
+    return np.array(scores, dtype=SCORE_DTYPE)
+
+def check_bank(label, bank, paths=CHECK_PATHS, seed=0):
+    # -> (recorridos comprobados, diferencias en texto). Incluye preguntas sin responder (tests adaptativos)
+    rng = np.random.default_rng(seed); checked = 0; problems = []
+    for code in [c for c in bank.sectors if c]:
+        qids = bank.sector_index(code)
+        for strategy, bias in STRATEGIES.items():
+            choices = sample_choices(rng, option_probabilities(bank, qids, bias), paths)
+            choices[rng.random(choices.shape) < 0.1] = NO_ANSWER
+            batch = score_choices(bank, qids, choices)
+            for path, scores in zip(choices, batch):
+                expected = reference_scores(bank, qids, path); checked += 1
+                if not np.array_equal(scores, expected) or calculate_results(scores) != calculate_results(expected):
+                    problems.append(f"{label}/{code}/{strategy}: {''.join('-' if o == NO_ANSWER else OPTION_LETTERS[o] for o in path)} -> {calculate_results(scores)[:3]} != {calculate_results(expected)[:3]}")
+    return checked, problems
+
+def check(banks=BANKS, paths=CHECK_PATHS, seed=0):
+    # Bancos del proyecto y, de cada uno, una variante con lógicas aleatorias
+    checked = 0; problems = []
+    tmp = tempfile.mkdtemp(prefix="sape_check_")
+    for path in banks:
+        bank = load_bank(path)
+        if not len(bank): raise RuntimeError(f"Banco vacío o ilegible: {path}")
+        rnd_path = os.path.join(tmp, f"{bank.name}_aleatorio.csv")
+        with open(rnd_path, 'wb') as f: f.write(encoded(random_logic_text(bank_text(bank), np.random.default_rng(seed)), "utf-8-sig"))
+        for label, b in ((bank.name, bank), (f"{bank.name}_aleatorio", load_bank(rnd_path))):
+            n, p = check_bank(label, b, paths, seed); checked += n; problems += p
+    return checked, problems
+
+def print_check(checked, problems):
+    print(f"equivalencia: {checked:,} recorridos, {len(problems)} diferencias")
+    for p in problems[:20]: print(f"DIFERENCIA {p}")
+
+# --- CASOS ---
+def bank_cases(label, bank, text):
+    # Casos que dependen del tamaño del banco: -> {nombre: (función, detalle)}
+    cases = {}
+    for enc in ENCODINGS:
+        raw = encoded(text, enc)
+        detected = decode_rows(raw)[1]
+        def compile_cold(raw=raw): return ScenarioBank(decode_rows(raw)[0], source=bank.source)
+        cases[f"{label}/load/{enc}"] = (compile_cold, {"detected": detected, "bytes": len(raw)})
+    logic = [row.get(f'OPCION_{letter}_LOGIC') for row in bank.rows for letter in OPTION_LETTERS]
+    cases[f"{label}/parse_logic"] = (lambda: [parse_logic(s) for s in logic], {"options": len(logic)})
+    qids = bank.sector_index(DEFAULT_SECTOR)
+    choices = sample_choices(np.random.default_rng(0), option_probabilities(bank, qids, next(iter(STRATEGIES.values()))), BATCH)
+    single = [(int(q), int(o)) for q, o in zip(qids, choices[0])]
+    def apply_single():
+        scores = new_scores()
+        for q, o in single: scores = bank.apply_option(scores, q, o)
+        return scores
+    cases[f"{label}/apply/single"] = (apply_single, {"questions": len(qids)})
+    cases[f"{label}/apply/batch{BATCH}"] = (lambda: score_choices(bank, qids, choices, validate=False), {"questions": len(qids), "candidates": BATCH})
+    cases[f"{label}/apply/batch{BATCH}+validate"] = (lambda: score_choices(bank, qids, choices), {"questions": len(qids), "candidates": BATCH})
+    scores = score_choices(bank, qids, choices, validate=False)
+    cases[f"{label}/results/single"] = (lambda: calculate_results(scores[0]), {})
+    cases[f"{label}/results/batch{BATCH}"] = (lambda: results_batch(scores), {"candidates": BATCH})
+    return cases
+
+def render_cases(bank, pdf=True):
+    # Radar y PDF de un candidato (no dependen del tamaño del banco)
+    from charts import radar_figure
+    from norms import SKETCH_METRICS
+    from reports import PDF_AVAILABLE, render_report, report_payload
+    from scoring import friction_reasons
+    qids = bank.sector_index(DEFAULT_SECTOR)
+    scores = score_choices(bank, qids, sample_choices(np.random.default_rng(1), option_probabilities(bank, qids, next(iter(STRATEGIES.values()))), 1), validate=False)[0]
+    octagon = octagon_dict(scores)
+    median = {m: 50.0 for m in SKETCH_METRICS}
+    fig = radar_figure(octagon, median)
+    cases = {
+        "render/radar/build": (lambda: radar_figure(octagon), {}),
+        "render/radar/build+median": (lambda: radar_figure(octagon, median), {}),
+        "render/radar/to_json": (lambda: fig.to_json(), {"bytes": len(fig.to_json())}),
+    }
+    if pdf and PDF_AVAILABLE:
+        ire, avg, friction, triggers = calculate_results(scores)[:4]
+        user = {"name": "Benchmark", "sector": DEFAULT_SECTOR}
+        payload = report_payload("BENCH", user, (ire, avg, friction, triggers, friction_reasons(friction, triggers), 0), octagon, flags_dict(scores), "2026-01-19T12:45:00")
+        norms = {"n": 500, "percentiles": {m: 50 for m in SKETCH_METRICS}, "median": median}
+        cases["render/pdf"] = (lambda: render_report(payload), {"bytes": len(render_report(payload))})
+        cases["render/pdf+norms"] = (lambda: render_report(dict(payload, norms=norms)), {})
+    return cases
+
+def run(banks=BANKS, scale=SCALE, min_time=MIN_TIME, repeat=REPEAT, pattern=None, pdf=True):
+    cases = {}; refs = {}
+    tmp = tempfile.mkdtemp(prefix="sape_bench_")
+    for path in banks:
+        bank = load_bank(path)
+        if not len(bank): raise RuntimeError(f"Banco vacío o ilegible: {path}")
+        text = bank_text(bank); big_text = scaled_text(text, scale)
+        big_path = os.path.join(tmp, f"{bank.name}x{scale}.csv")
+        with open(big_path, 'wb') as f: f.write(encoded(big_text, "utf-8-sig"))
+        big = load_bank(big_path)
+        for label, b, t in ((bank.name, bank, text), (big.name, big, big_text)):
+            refs[label] = {"ref": b.ref, "questions": len(b)}
+            cases.update(bank_cases(label, b, t))
+    cases.update(render_cases(load_bank(banks[0]), pdf))
+    results = {}
+    for name, (fn, info) in cases.items():
+        if not pattern or pattern in name: results[name] = dict(timeit(fn, min_time, repeat), **info)
+    return {
+        "meta": {"created": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(), "numpy": np.__version__,
+                 "platform": platform.platform(), "min_time": min_time, "repeat": repeat, "banks": refs},
+        "results": results,
+    }
+
+# --- COMPARACIÓN ---
+def compare(baseline, report, threshold, stat="min_us"):
+    # -> (filas [(caso, antes, ahora, ratio)], regresiones en texto)
+    rows = []; problems = []
+    for name, r in report["results"].items():
+        b = baseline["results"].get(name)
+        if not b: rows.append((name, None, r[stat], None)); continue
+        ratio = r[stat] / b[stat] if b[stat] else float("inf")
+        rows.append((name, b[stat], r[stat], ratio))
+        if ratio > 1 + threshold: problems.append(f"{name}: {b[stat]:,.1f} -> {r[stat]:,.1f} µs (x{ratio:.2f}, umbral +{threshold:.0%})")
+    for label, info in report["meta"]["banks"].items():
+        old = baseline["meta"].get("banks", {}).get(label)
+        if old and old["ref"] != info["ref"]: print(f"AVISO {label}: banco distinto ({old['ref']} -> {info['ref']}), los tiempos no son del todo comparables")
+    return rows, problems
+
+def print_report(report):
+    print(f"{'caso':<40}{'mín µs':>14}{'mediana µs':>14}  detalle")
+    for name, r in report["results"].items():
+        detail = ", ".join(f"{k}={v}" for k, v in r.items() if k not in ("min_us", "median_us", "number", "repeat"))
+        print(f"{name:<40}{r['min_us']:>14,.1f}{r['median_us']:>14,.1f}  {detail}")
+
+def print_comparison(rows, problems):
+    print(f"{'caso':<40}{'antes µs':>14}{'ahora µs':>14}{'ratio':>8}")
+    for name, before, now, ratio in rows:
+        print(f"{name:<40}{'-' if before is None else f'{before:,.1f}':>14}{now:>14,.1f}{'nuevo' if ratio is None else f'x{ratio:.2f}':>8}")
+    for p in problems: print(f"REGRESIÓN {p}")
+
+def load_json(path):
+    with open(path, encoding="utf-8") as f: return json.load(f)
+
+def main():
+    ap = argparse.ArgumentParser(description="Micro-benchmarks de carga del banco, puntuación, radar y PDF")
+    sub = ap.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("run", help="ejecuta los casos y, opcionalmente, compara con una referencia")
+    r.add_argument("--banks", nargs="*", default=BANKS)
+    r.add_argument("--scale", type=int, default=SCALE, help="tamaño de los bancos sintéticos (veces el original)")
+    r.add_argument("--min-time", type=float, default=MIN_TIME, help="segundos por caso")
+    r.add_argument("--repeat", type=int, default=REPEAT)
+    r.add_argument("--filter", help="solo los casos cuyo nombre contiene este texto")
+    r.add_argument("--no-pdf", action="store_true")
+    r.add_argument("--out", help="guarda el resultado en JSON (p. ej. como nueva referencia)")
+    r.add_argument("--baseline", help="JSON de referencia con el que comparar")
+    r.add_argument("--threshold", type=float, default=0.2, help="regresión si el tiempo crece más de esta fracción")
+    r.add_argument("--no-check", action="store_true", help="no comprueba antes la equivalencia con la puntuación pregunta a pregunta")
+    c = sub.add_parser("compare", help="compara dos JSON ya guardados")
+    c.add_argument("baseline")
+    c.add_argument("report")
+    c.add_argument("--threshold", type=float, default=0.2)
+    c.add_argument("--stat", choices=["min_us", "median_us"], default="min_us")
+    k = sub.add_parser("check", help="compara el motor vectorizado con la puntuación pregunta a pregunta")
+    k.add_argument("--banks", nargs="*", default=BANKS)
+    k.add_argument("--paths", type=int, default=CHECK_PATHS, help="recorridos por sector y estrategia")
+    k.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    if args.command == "compare":
+        rows, problems = compare(load_json(args.baseline), load_json(args.report), args.threshold, args.stat)
+        print_comparison(rows, problems)
+        sys.exit(1 if problems else 0)
+    if args.command == "check":
+        checked, problems = check(args.banks, args.paths, args.seed)
+        print_check(checked, problems)
+        sys.exit(1 if problems else 0)
+    if not args.no_check:
+        checked, problems = check(args.banks)
+        print_check(checked, problems); print()
+        if problems: sys.exit(1)
+    report = run(args.banks, args.scale, args.min_time, args.repeat, args.filter, not args.no_pdf)
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=1)
+    if not args.baseline: return
+    rows, problems = compare(load_json(args.baseline), report, args.threshold)
+    print(); print_comparison(rows, problems)
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
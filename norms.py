@@ -0,0 +1,75 @@
+# --- NORMAS POR SECTOR (PERCENTILES EN STREAMING) ---
+# Un sketch de cuantiles por sector y métrica (IRE, potencial, fricción y cada dimensión del octógono).
+# Como todas las métricas están acotadas a [0, 100], el sketch es un histograma de ancho fijo (medio
+# punto por cubeta, como calibration.py): actualización O(1), mezclable entre sectores y exacto hasta
+# la cubeta (exacto del todo para el octógono, que es entero); más preciso y compacto que un t-digest
+# en este rango. En la base se guarda disperso (solo cubetas no vacías) y lo actualiza un trigger SQL.
+import numpy as np
+
+from scenario_bank import OCTAGON_KEYS
+
+BINS_PER_POINT = 2
+N_BINS = 100 * BINS_PER_POINT + 1  # la última cubeta es exactamente 100
+SKETCH_METRICS = ["ire", "potential", "friction"] + OCTAGON_KEYS
+MIN_NORM_N = 30  # por debajo, la comparación con el sector no se muestra
+
+def value_bin(value): return min(max(int(value * BINS_PER_POINT), 0), N_BINS - 1)
+
+class QuantileSketch:
+    def __init__(self, counts=None):
+        self.counts = np.zeros(N_BINS, dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        self._cum = None
+
+    @property
+    def n(self): return int(self.counts.sum())
+
+    def add(self, value):
+        self.counts[value_bin(value)] += 1; self._cum = None
+
+    def merge(self, other):
+        self.counts += other.counts; self._cum = None
+        return self
+
+    def cumulative(self):
+        if self._cum is None: self._cum = np.cumsum(self.counts)
+        return self._cum
+
+    def quantile(self, q):
+        # Límite inferior de la cubeta que contiene el cuantil q (0-1)
+        cum = self.cumulative()
+        if not cum[-1]: return None
+        return int(np.searchsorted(cum, q * cum[-1], side="left")) / BINS_PER_POINT
+
+    def rank(self, value):
+        # Percentil (0-100) de `value` en la cohorte: por debajo + la mitad de su propia cubeta
+        cum = self.cumulative()
+        if not cum[-1]: return None
+        b = value_bin(value)
+        below = cum[b - 1] if b else 0
+        return 100 * (below + 0.5 * self.counts[b]) / cum[-1]
+
+    def to_sparse(self): return [(int(b), int(c)) for b, c in enumerate(self.counts) if c]
+
+    @classmethod
+    def from_sparse(cls, pairs):
+        sketch = cls()
+        for b, c in pairs: sketch.counts[b] += c
+        return sketch
+
+def cohort_summary(sketches, ire, potential, friction, octagon):
+    # Percentiles del candidato y mediana del sector, en tipos nativos (session_state, payload del PDF)
+    n = sketches["ire"].n if sketches else 0
+    if n < MIN_NORM_N: return {"n": n}
+    values = {"ire": ire, "potential": potential, "friction": friction, **octagon}
+    return {
+        "n": n,
+        "percentiles": {m: round(sketches[m].rank(v)) for m, v in values.items()},
+        "median": {m: sketches[m].quantile(0.5) for m in SKETCH_METRICS},
+    }
+
+def level_shares(sketch, high, medium):
+    # Reparto alto/medio/bajo de la cohorte con los umbrales de IRE, a la precisión de la cubeta (medio punto)
+    cum = sketch.cumulative(); n = cum[-1]
+    if not n: return None
+    upto = lambda v: cum[value_bin(v)] / n
+    return {"alto": 1 - upto(high), "medio": upto(high) - upto(medium), "bajo": upto(medium)}
@@ -0,0 +1,208 @@
+# --- INFORMES PDF (S.A.P.E.) ---
+# El PDF se genera en un pool de procesos fuera del rerun de Streamlit. Cada informe se identifica
+# por un hash de su contenido (datos del candidato, octógono, flags y versión de plantilla), así que
+# los reruns de la página de resultados reutilizan el mismo Future en lugar de volver a dibujarlo.
+# El modo masivo genera los informes de una cohorte en paralelo y los va escribiendo en un ZIP por
+# streaming, con un número acotado de PDFs en memoria.
+#
+#   python reports.py --db resultados.db --out informes.zip [--sector TECH]
+import argparse
+import hashlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import datetime
+from functools import lru_cache
+
+from metrics import observe_future
+from norms import cohort_summary
+from results_store import RESULTS_DB, ResultsStore
+from scenario_bank import FLAG_KEYS, LABELS_ES, OCTAGON_KEYS, flags_dict, octagon_dict
+from scoring import calculate_results, friction_reasons
+
+# reportlab solo se importa en los procesos que dibujan (workers del pool), no en el servidor
+PDF_AVAILABLE = importlib.util.find_spec("reportlab") is not None
+
+TEMPLATE_VERSION = "2"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGO_PATH = os.path.join(BASE_DIR, "logo_original.png")
+PDF_WORKERS = int(os.environ.get("SAPE_PDF_WORKERS", min(4, os.cpu_count() or 1)))
+CACHE_SIZE = 256
+# El ZIP del panel de Oryon se genera entero antes de servirse y Streamlit lo retiene en memoria hasta
+# que se descarga (~1,5 KB por candidato): por encima de este tamaño solo se genera desde la línea de comandos
+MAX_PANEL_ZIP = int(os.environ.get("SAPE_MAX_PANEL_ZIP", 2000))
+
+# --- DIBUJO ---
+@lru_cache(maxsize=1)
+def logo_reader():
+    # Se lee y decodifica una sola vez por proceso
+    from reportlab.lib.utils import ImageReader
+    if not os.path.exists(LOGO_PATH): return None
+    try:
+        with open(LOGO_PATH, 'rb') as f: return ImageReader(io.BytesIO(f.read()))
+    except Exception: return None
+
+def draw_pdf_header(p, w, h):
+    p.setFillColorRGB(0.02, 0.04, 0.12); p.rect(0, h-100, w, 100, fill=1, stroke=0)
+    p.setFillColorRGB(1, 1, 1); p.rect(30, h-85, 140, 70, fill=1, stroke=0)
+    img = logo_reader()
+    if img:
+        try: p.drawImage(img, 40, h-80, width=120, height=60, preserveAspectRatio=True, mask='auto')
+        except Exception: pass
+    p.setFillColorRGB(1, 1, 1); p.setFont("Helvetica-Bold", 16); p.drawRightString(w-30, h-40, "INFORME TÉCNICO S.A.P.E.")
+    p.setFont("Helvetica", 10); p.drawRightString(w-30, h-55, "Sistema de Análisis de la Personalidad Emprendedora")
+
+def create_pdf_report(ire, avg, friction, triggers, friction_reasons, delta, user, stats, result_id, date, norms=None):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO(); p = canvas.Canvas(buffer, pagesize=A4); w, h = A4; draw_pdf_header(p, w, h)
+    y = h - 130
+    p.setFillColorRGB(0,0,0); p.setFont("Helvetica-Bold", 10)
+    p.drawString(40, y, f"Candidato: {user.get('name', 'N/A')}"); p.drawString(300, y, f"ID: {result_id}"); y -= 20
+    p.drawString(40, y, f"Sector: {user.get('sector', 'N/A')}"); p.drawString(300, y, f"Fecha: {date}"); y -= 40
+    p.setFont("Helvetica-Bold", 12); p.drawString(40, y, f"IRE: {ire}/100"); y -= 30
+    if norms and norms.get("percentiles"):
+        pct, med = norms["percentiles"], norms["median"]
+        p.setFont("Helvetica-Bold", 10); p.drawString(40, y, f"Comparativa con el sector ({norms['n']} candidatos)"); y -= 18
+        p.setFont("Helvetica", 10)
+        p.drawString(40, y, f"Percentiles: IRE P{pct['ire']} · Potencial P{pct['potential']} · Fricción P{pct['friction']}"); y -= 18
+        for k in OCTAGON_KEYS:
+            p.drawString(40, y, f"{LABELS_ES[k]}: {stats.get(k)} (mediana del sector {med[k]:g}, P{pct[k]})"); y -= 14
+    p.showPage(); p.save(); return buffer.getvalue()
+
+# --- CONTENIDO Y HASH ---
+def report_payload(result_id, user, results, octagon, flags, finished_at=None, norms=None):
+    ire, avg, friction, triggers, fric_reasons, delta = results
+    date = datetime.fromisoformat(finished_at) if finished_at else datetime.now()
+    return {
+        "id": result_id, "date": date.strftime('%d/%m/%Y'), "user": {k: user.get(k) for k in ("name", "sector")},
+        "ire": ire, "avg": avg, "friction": friction, "triggers": list(triggers), "fric_reasons": list(fric_reasons), "delta": delta,
+        "octagon": dict(octagon), "flags": dict(flags), "norms": norms or {},
+    }
+
+def report_key(payload):
+    blob = json.dumps([TEMPLATE_VERSION, payload], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+def render_report(payload):
+    return create_pdf_report(payload["ire"], payload["avg"], payload["friction"], payload["triggers"], payload["fric_reasons"],
+                             payload["delta"], payload["user"], payload["octagon"], payload["id"], payload["date"], payload.get("norms"))
+
+# --- POOL Y CACHÉ ---
+_pool = None
+_pool_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: los workers no heredan los hilos del servidor de Streamlit
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown_pool():
+    # Necesario en procesos hijos de otro pool: su salida no ejecuta los atexit de concurrent.futures
+    global _pool
+    with _pool_lock:
+        if _pool is not None: _pool.shutdown(cancel_futures=True); _pool = None
+
+def submit_report(payload):
+    # Devuelve un Future con los bytes del PDF; informes idénticos comparten el mismo Future
+    key = report_key(payload)
+    with _cache_lock:
+        future = _cache.get(key)
+        if future is not None and not (future.done() and future.exception()):
+            _cache.move_to_end(key)
+            return future
+        future = observe_future("create_pdf_report", get_pool().submit(render_report, payload))
+        _cache[key] = future
+        while len(_cache) > CACHE_SIZE: _cache.popitem(last=False)
+        return future
+
+def wait_reports(timeout=None):
+    # Espera a los informes en curso de este proceso (scripts y prueba de carga)
+    with _cache_lock: futures = list(_cache.values())
+    wait(futures, timeout)
+
+# --- EXPORTACIÓN MASIVA (ZIP) ---
+class ChunkSink(io.RawIOBase):
+    # Destino no seekable para zipfile: acumula lo escrito hasta que el generador lo entrega
+    def __init__(self): self.chunks = []
+    def writable(self): return True
+    def write(self, b): self.chunks.append(bytes(b)); return len(b)
+    def drain(self):
+        out = b"".join(self.chunks); self.chunks = []; return out
+
+def report_filename(payload): return f"Informe_SAPE_{payload['id']}.pdf"
+
+def iter_cohort_zip(payloads, workers=None, window=None):
+    # Genera el ZIP en trozos; como mucho `window` PDFs en vuelo (y en memoria) a la vez
+    pool = get_pool() if workers is None else ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    window = window or 2 * (workers or PDF_WORKERS)
+    sink = ChunkSink()
+    pending = deque()
+    try:
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            for payload in payloads:
+                pending.append((report_filename(payload), pool.submit(render_report, payload)))
+                if len(pending) >= window:
+                    name, future = pending.popleft(); zf.writestr(name, future.result())
+                    yield sink.drain()
+            while pending:
+                name, future = pending.popleft(); zf.writestr(name, future.result())
+                yield sink.drain()
+        yield sink.drain()
+    finally:
+        if workers is not None: pool.shutdown(cancel_futures=True)
+
+def write_cohort_zip(payloads, fileobj, workers=None):
+    n = 0
+    for chunk in iter_cohort_zip(payloads, workers):
+        fileobj.write(chunk); n += len(chunk)
+    return n
+
+def cohort_zip_file(payloads, workers=None):
+    # Fichero temporal (en disco a partir de 32 MB) listo para st.download_button; el panel solo lo pide
+    # para cohortes de hasta MAX_PANEL_ZIP candidatos
+    f = tempfile.SpooledTemporaryFile(max_size=32 * 1024 * 1024)
+    write_cohort_zip(payloads, f, workers); f.seek(0)
+    return f
+
+def stored_payloads(store, sector_code=None):
+    # La comparativa usa los sketches actuales de cada sector (cacheados en el almacén)
+    # Un test adaptativo parado antes de tiempo se informa, como en la app, con su proyección
+    for r in store.iter_results(sector_code):
+        if r["projected_scores"]:
+            scores = json.loads(r["projected_scores"])
+            results = calculate_results(scores); octagon = octagon_dict(scores); flags = flags_dict(scores)
+        else:
+            triggers = [t for t in (r["triggers"] or "").split(",") if t]
+            results = (r["ire"], r["potential"], r["friction"], triggers, friction_reasons(r["friction"], triggers), 0)
+            octagon = {k: r[k] for k in OCTAGON_KEYS}; flags = {k: r[k] for k in FLAG_KEYS}
+        norms = cohort_summary(store.sketches(r["sector_code"]), *results[:3], octagon)
+        yield report_payload(r["code"], r, results, octagon, flags, r["finished_at"], norms)
+
+def main():
+    ap = argparse.ArgumentParser(description="Exporta los informes PDF de una cohorte en un ZIP")
+    ap.add_argument("--db", default=RESULTS_DB)
+    ap.add_argument("--sector")
+    ap.add_argument("--out", default="informes.zip")
+    ap.add_argument("--workers", type=int, default=PDF_WORKERS)
+    args = ap.parse_args()
+    store = ResultsStore(args.db)
+    t = time.perf_counter()
+    with open(args.out, 'wb') as f: size = write_cohort_zip(stored_payloads(store, args.sector), f, args.workers)
+    print(f"{args.out}: {size / 1e6:.1f} MB en {time.perf_counter() - t:.1f}s")
+
+if __name__ == "__main__":
+    main()
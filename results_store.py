@@ -0,0 +1,341 @@
+# --- ALMACÉN DE RESULTADOS (SQLite en modo WAL) ---
+# Los candidatos finalizados se encolan con submit() y un hilo escritor los vuelca por lotes, en una
+# sola transacción, sin bloquear el rerun de Streamlit. WAL + busy_timeout permite que varios procesos
+# del servidor escriban en la misma base; INSERT OR IGNORE sobre el ID hace idempotente el reenvío.
+# El ID es único (uuid4) y el código corto que ve el candidato se guarda aparte (`code`).
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+from datetime import datetime
+
+from norms import BINS_PER_POINT, N_BINS, SKETCH_METRICS, QuantileSketch
+from scenario_bank import DIMENSIONS, OCTAGON_KEYS, OPTION_LETTERS
+from scoring import IRE_MEDIUM
+
+log = logging.getLogger(__name__)
+
+RESULTS_DB = os.environ.get("SAPE_RESULTS_DB", "resultados.db")
+BATCH_MAX = 500
+FLUSH_INTERVAL = 0.2
+BUSY_TIMEOUT_MS = 30_000
+WRITE_ATTEMPTS = 6  # solo para "database is locked/busy"; el resto de errores no se reintenta
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 5.0
+
+USER_FIELDS = ["name", "age", "gender", "country", "situation", "experience", "sector"]
+GRID_STEP = 5  # celdas de la matriz de riesgo (potencial x fricción) de 5 puntos
+GRID_MAX = 100 // GRID_STEP - 1
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    code TEXT,
+    finished_at TEXT NOT NULL,
+    {", ".join(f"{f} {'INTEGER' if f == 'age' else 'TEXT'}" for f in USER_FIELDS)},
+    sector_code TEXT NOT NULL,
+    bank_version TEXT,
+    ire REAL, potential REAL, friction REAL, triggers TEXT,
+    questions_asked INTEGER, projected_scores TEXT,
+    {", ".join(f"{d} INTEGER NOT NULL DEFAULT 0" for d in DIMENSIONS)}
+);
+CREATE INDEX IF NOT EXISTS results_sector ON results (sector_code, finished_at);
+CREATE INDEX IF NOT EXISTS results_finished ON results (finished_at);
+CREATE TABLE IF NOT EXISTS answers (
+    result_id TEXT NOT NULL REFERENCES results (id),
+    step INTEGER NOT NULL,
+    question INTEGER NOT NULL,
+    option TEXT NOT NULL,
+    PRIMARY KEY (result_id, step)
+) WITHOUT ROWID;
+"""
+
+# Agregados del panel de entidad: se mantienen con un trigger en la misma transacción que el INSERT,
+# así que son coherentes entre procesos y los reenvíos ignorados (INSERT OR IGNORE) no cuentan doble.
+STAT_SUMS = ["ire", "potential", "friction"] + OCTAGON_KEYS
+AGGREGATES = f"""
+CREATE TABLE IF NOT EXISTS sector_stats (
+    sector_code TEXT PRIMARY KEY,
+    n INTEGER NOT NULL, high_risk INTEGER NOT NULL, with_triggers INTEGER NOT NULL,
+    {", ".join(f"sum_{c} REAL NOT NULL" for c in STAT_SUMS)}
+);
+CREATE TABLE IF NOT EXISTS risk_grid (
+    sector_code TEXT NOT NULL, potential_bin INTEGER NOT NULL, friction_bin INTEGER NOT NULL,
+    n INTEGER NOT NULL, sum_ire REAL NOT NULL,
+    PRIMARY KEY (sector_code, potential_bin, friction_bin)
+) WITHOUT ROWID;
+"""
+# Los tests adaptativos con parada temprana (projected_scores) no cuentan: sus puntuaciones son parciales
+AGGREGATE_TRIGGER = f"""
+CREATE TRIGGER IF NOT EXISTS results_aggregate AFTER INSERT ON results WHEN NEW.projected_scores IS NULL BEGIN
+    INSERT INTO sector_stats (sector_code, n, high_risk, with_triggers, {", ".join(f"sum_{c}" for c in STAT_SUMS)})
+    VALUES (NEW.sector_code, 1, NEW.ire <= {IRE_MEDIUM}, NEW.triggers != '', {", ".join(f"NEW.{c}" for c in STAT_SUMS)})
+    ON CONFLICT (sector_code) DO UPDATE SET n = n + 1, high_risk = high_risk + excluded.high_risk, with_triggers = with_triggers + excluded.with_triggers,
+        {", ".join(f"sum_{c} = sum_{c} + excluded.sum_{c}" for c in STAT_SUMS)};
+    INSERT INTO risk_grid (sector_code, potential_bin, friction_bin, n, sum_ire)
+    VALUES (NEW.sector_code, MIN(CAST(NEW.potential / {GRID_STEP} AS INTEGER), {GRID_MAX}), MIN(CAST(NEW.friction / {GRID_STEP} AS INTEGER), {GRID_MAX}), 1, NEW.ire)
+    ON CONFLICT (sector_code, potential_bin, friction_bin) DO UPDATE SET n = n + 1, sum_ire = sum_ire + excluded.sum_ire;
+END;
+"""
+
+# Sketches de cuantiles por sector y métrica (norms.py), en formato disperso: una fila por cubeta no vacía
+def sql_bin(expr): return f"MIN(MAX(CAST({expr} * {BINS_PER_POINT} AS INTEGER), 0), {N_BINS - 1})"
+QUANTILES = """
+CREATE TABLE IF NOT EXISTS quantile_bins (
+    sector_code TEXT NOT NULL, metric TEXT NOT NULL, bin INTEGER NOT NULL, n INTEGER NOT NULL,
+    PRIMARY KEY (sector_code, metric, bin)
+) WITHOUT ROWID;
+"""
+QUANTILE_TRIGGER = f"""
+CREATE TRIGGER IF NOT EXISTS results_quantiles AFTER INSERT ON results WHEN NEW.projected_scores IS NULL BEGIN
+    INSERT INTO quantile_bins (sector_code, metric, bin, n)
+    VALUES {", ".join(f"(NEW.sector_code, '{m}', {sql_bin(f'NEW.{m}')}, 1)" for m in SKETCH_METRICS)}
+    ON CONFLICT (sector_code, metric, bin) DO UPDATE SET n = n + 1;
+END;
+"""
+SCHEMA_VERSION = 4
+ADDED_COLUMNS = {"questions_asked": "INTEGER", "projected_scores": "TEXT", "code": "TEXT"}  # columnas de las versiones 3 y 4
+
+_open_stores = weakref.WeakSet()
+
+def close_all():
+    # Vacía las colas de todos los almacenes abiertos en este proceso
+    for store in list(_open_stores): store.close()
+
+RESULT_COLUMNS = ["id", "code", "finished_at"] + USER_FIELDS + ["sector_code", "bank_version", "ire", "potential", "friction", "triggers", "questions_asked", "projected_scores"] + DIMENSIONS
+
+def is_transient(error):
+    msg = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in msg or "busy" in msg)
+
+def connect(path):
+    con = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return con
+
+def make_record(result_id, user, sector_code, bank_version, scores, results, qids, choices, finished_at=None, projection=None, code=None):
+    # results = (ire, potencial, fricción, triggers, ...) tal como lo devuelve calculate_results() sobre
+    # `scores`, que son siempre las respuestas reales; `projection` es el vector proyectado de un test
+    # adaptativo parado antes de tiempo (se guarda aparte y no entra en agregados ni normas); `code` es el
+    # código que se enseña (por defecto, el propio ID)
+    ire, avg, friction, triggers = results[:4]
+    return {
+        "id": result_id, "code": code or result_id, "finished_at": finished_at or datetime.now().isoformat(timespec="seconds"),
+        **{f: user.get(f) for f in USER_FIELDS},
+        "sector_code": sector_code, "bank_version": bank_version,
+        "ire": ire, "potential": avg, "friction": friction, "triggers": ",".join(triggers),
+        "questions_asked": sum(1 for o in choices if o >= 0),
+        "projected_scores": None if projection is None else json.dumps([int(v) for v in projection]),
+        **{d: int(v) for d, v in zip(DIMENSIONS, scores)},
+        "answers": [(step, int(q), OPTION_LETTERS[o]) for step, (q, o) in enumerate(zip(qids, choices)) if o >= 0],
+    }
+
+class ResultsStore:
+    def __init__(self, path=RESULTS_DB):
+        self.path = path
+        self.dead_letter_path = f"{path}.fallidos.jsonl"
+        self.queue = queue.Queue()
+        self._local = threading.local()
+        self.migrate()
+        self._writer = None
+        self._lock = threading.Lock()
+        self._closed = False
+        _open_stores.add(self)
+        atexit.register(self.close)
+
+    def connection(self):
+        # Una conexión por hilo: en WAL los lectores no bloquean al escritor ni entre sí
+        con = getattr(self._local, "con", None)
+        if con is None: con = self._local.con = connect(self.path)
+        return con
+
+    def migrate(self):
+        # Todo en una transacción: si varios procesos arrancan a la vez, solo uno crea y reconstruye
+        con = self.connection()
+        con.executescript("BEGIN IMMEDIATE;" + SCHEMA + AGGREGATES + QUANTILES)
+        try:
+            version = con.execute("PRAGMA user_version").fetchone()[0]
+            columns = {row[1] for row in con.execute("PRAGMA table_info(results)")}
+            for name, kind in ADDED_COLUMNS.items():
+                if name not in columns: con.execute(f"ALTER TABLE results ADD COLUMN {name} {kind}")
+            if version < 4: con.execute("UPDATE results SET code = id WHERE code IS NULL")  # hasta la v3 el ID era el código corto
+            if version < SCHEMA_VERSION:
+                con.execute("DROP TRIGGER IF EXISTS results_aggregate"); con.execute("DROP TRIGGER IF EXISTS results_quantiles")
+            con.execute(AGGREGATE_TRIGGER); con.execute(QUANTILE_TRIGGER)
+            if version < SCHEMA_VERSION: self.rebuild_aggregates(con)
+            con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK"); raise
+
+    def rebuild_aggregates(self, con):
+        # Bases creadas antes de los agregados: se recalculan una vez a partir de las filas existentes
+        con.execute("DELETE FROM sector_stats"); con.execute("DELETE FROM risk_grid"); con.execute("DELETE FROM quantile_bins")
+        con.execute(f"""INSERT INTO sector_stats SELECT sector_code, COUNT(*), SUM(ire <= {IRE_MEDIUM}), SUM(triggers != ''), {", ".join(f"TOTAL({c})" for c in STAT_SUMS)}
+                       FROM results WHERE projected_scores IS NULL GROUP BY sector_code""")
+        con.execute(f"""INSERT INTO risk_grid SELECT sector_code, MIN(CAST(potential / {GRID_STEP} AS INTEGER), {GRID_MAX}), MIN(CAST(friction / {GRID_STEP} AS INTEGER), {GRID_MAX}), COUNT(*), TOTAL(ire)
+                       FROM results WHERE projected_scores IS NULL GROUP BY 1, 2, 3""")
+        for m in SKETCH_METRICS:
+            con.execute(f"INSERT INTO quantile_bins SELECT sector_code, '{m}', {sql_bin(m)}, COUNT(*) FROM results WHERE projected_scores IS NULL GROUP BY 1, 3")
+
+    # --- ESCRITURA ---
+    def submit(self, record):
+        # No bloquea: el registro se escribe en el siguiente lote del hilo escritor
+        self._ensure_writer()
+        self.queue.put(record)
+
+    def _ensure_writer(self):
+        if self._writer and self._writer.is_alive(): return
+        with self._lock:
+            if self._writer and self._writer.is_alive(): return
+            self._writer = threading.Thread(target=self._run, name="results-writer", daemon=True)
+            self._writer.start()
+
+    def _run(self):
+        con = self.connection()
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_MAX:
+                try: batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty: break
+            stop = None in batch
+            records = [r for r in batch if r is not None]
+            attempt = 0
+            while records:
+                try:
+                    inserted = self.write_batch(records, con)
+                    if inserted < len(records): log.warning("%d resultado(s) con un ID ya guardado se han ignorado", len(records) - inserted)
+                    break
+                except sqlite3.Error as e:
+                    attempt += 1
+                    if is_transient(e) and attempt < WRITE_ATTEMPTS:
+                        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+                        log.warning("Reintentando lote de %d resultados en %.1fs: %s", len(records), delay, e)
+                        time.sleep(delay)
+                        continue
+                    log.error("Lote de %d resultados no escrito tras %d intento(s): %s", len(records), attempt, e)
+                    self.dead_letter(records, e)
+                    break
+            for _ in batch: self.queue.task_done()
+            if stop: return
+
+    def write_batch(self, records, con=None):
+        # -> resultados insertados. Un ID que ya existe se ignora entero: sus respuestas no se mezclan con
+        # las del resultado guardado, así que solo se insertan las de las filas que han entrado.
+        con = con or self.connection()
+        sql = f"INSERT OR IGNORE INTO results ({', '.join(RESULT_COLUMNS)}) VALUES ({', '.join('?' * len(RESULT_COLUMNS))})"
+        inserted = 0
+        with con:
+            con.execute("BEGIN IMMEDIATE")
+            for r in records:
+                if not con.execute(sql, tuple(r.get(c) for c in RESULT_COLUMNS)).rowcount: continue
+                con.executemany("INSERT INTO answers (result_id, step, question, option) VALUES (?, ?, ?, ?)", [(r["id"], step, q, opt) for step, q, opt in r.get("answers", [])])
+                inserted += 1
+        self._local.sketches = None  # data_version no cambia con las escrituras de la propia conexión
+        return inserted
+
+    def dead_letter(self, records, error):
+        # Los lotes que no se pueden escribir se guardan aparte (JSON por línea) para reintentarlos a mano
+        try:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                for r in records: f.write(json.dumps({"error": str(error), "record": r}, ensure_ascii=False, default=str) + "\n")
+        except OSError:
+            log.exception("No se pudo guardar el lote fallido en %s; %d resultados perdidos", self.dead_letter_path, len(records))
+
+    def flush(self):
+        # Espera a que el hilo escritor haya vaciado la cola (útil en scripts y pruebas de carga)
+        if self._writer and self._writer.is_alive(): self.queue.join()
+
+    def close(self):
+        if self._closed: return
+        self._closed = True
+        if self._writer and self._writer.is_alive():
+            self.queue.put(None)
+            self._writer.join()
+
+    # --- LECTURA ---
+    def count(self, sector_code=None):
+        con = self.connection()
+        if sector_code: return con.execute("SELECT COUNT(*) FROM results WHERE sector_code = ?", (sector_code,)).fetchone()[0]
+        return con.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def iter_results(self, sector_code=None, batch=1000):
+        # Recorre los resultados por bloques de `batch` filas (sin cargar la tabla entera)
+        sql = f"SELECT {', '.join(RESULT_COLUMNS)} FROM results"
+        args = []
+        if sector_code: sql += " WHERE sector_code = ?"; args.append(sector_code)
+        cur = self.connection().execute(sql + " ORDER BY finished_at, id", args)
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows: return
+            for row in rows: yield dict(zip(RESULT_COLUMNS, row))
+
+    def get(self, result_id):
+        con = self.connection()
+        cur = con.execute(f"SELECT {', '.join(RESULT_COLUMNS)} FROM results WHERE id = ?", (result_id,))
+        row = cur.fetchone()
+        if row is None: return None
+        record = dict(zip(RESULT_COLUMNS, row))
+        record["answers"] = con.execute("SELECT step, question, option FROM answers WHERE result_id = ? ORDER BY step", (result_id,)).fetchall()
+        return record
+
+    # --- RESPUESTAS POR VERSIÓN DEL BANCO (MODO ADAPTATIVO Y REPLAY) ---
+    def option_counts(self, bank_version):
+        # [(pregunta, opción, n)] de los tests guardados con esa versión del banco
+        return self.connection().execute("""SELECT a.question, a.option, COUNT(*) FROM answers a JOIN results r ON r.id = a.result_id
+                                            WHERE r.bank_version = ? GROUP BY 1, 2""", (bank_version,)).fetchall()
+
+    def answer_paths(self, bank_version, sector_code):
+        # {id: [(pregunta, opción), ...]} de los tests de un sector guardados con esa versión del banco
+        cur = self.connection().execute("""SELECT a.result_id, a.question, a.option FROM answers a JOIN results r ON r.id = a.result_id
+                                           WHERE r.bank_version = ? AND r.sector_code = ? ORDER BY a.result_id, a.step""", (bank_version, sector_code))
+        paths = {}
+        for result_id, q, option in cur: paths.setdefault(result_id, []).append((q, option))
+        return paths
+
+    # --- AGREGADOS Y PAGINACIÓN (PANEL DE ENTIDAD) ---
+    def sector_counts(self):
+        # {sector: resultados guardados}, incluidos los tests adaptativos que no entran en sector_stats
+        return dict(self.connection().execute("SELECT sector_code, COUNT(*) FROM results GROUP BY sector_code ORDER BY sector_code"))
+
+    def sector_stats(self):
+        cur = self.connection().execute("SELECT * FROM sector_stats ORDER BY sector_code")
+        cols = [c[0] for c in cur.description]
+        return {row[0]: dict(zip(cols, row)) for row in cur}
+
+    def sketches(self, sector_code=None):
+        # {métrica: QuantileSketch} de un sector (o de todos, mezclados). Se cachea por hilo hasta que
+        # otra conexión confirma escrituras (PRAGMA data_version), así que leer percentiles es casi gratis.
+        con = self.connection()
+        version = con.execute("PRAGMA data_version").fetchone()[0]
+        cache = getattr(self._local, "sketches", None)
+        if cache is None or cache[0] != version: cache = self._local.sketches = (version, {})
+        if sector_code not in cache[1]:
+            sql = "SELECT metric, bin, SUM(n) FROM quantile_bins"
+            args = []
+            if sector_code: sql += " WHERE sector_code = ?"; args.append(sector_code)
+            out = {m: QuantileSketch() for m in SKETCH_METRICS}
+            for metric, b, n in con.execute(sql + " GROUP BY metric, bin", args):
+                if metric in out: out[metric].counts[b] += n
+            cache[1][sector_code] = out
+        return cache[1][sector_code]
+
+    def risk_grid(self, sector_code=None):
+        sql = "SELECT sector_code, potential_bin, friction_bin, n, sum_ire FROM risk_grid"
+        if sector_code: return self.connection().execute(sql + " WHERE sector_code = ?", (sector_code,)).fetchall()
+        return self.connection().execute(sql).fetchall()
+
+    def page(self, offset, limit, sector_code=None, columns=("code", "finished_at", "name", "sector_code", "ire", "potential", "friction", "triggers")):
+        sql = f"SELECT {', '.join(columns)} FROM results"
+        args = []
+        if sector_code: sql += " WHERE sector_code = ?"; args.append(sector_code)
+        sql += " ORDER BY finished_at DESC, id LIMIT ? OFFSET ?"
+        return self.connection().execute(sql, args + [limit, offset]).fetchall()
@@ -0,0 +1,243 @@
+# --- BANCO DE ESCENARIOS COMPILADO (S.A.P.E.) ---
+# Se compila una sola vez por versión de contenido (sha1 del fichero): filas indexadas por sector
+# y lógica de cada opción pre-parseada a vectores numéricos sobre octógono + flags. Varios bancos
+# (SATE_v1, SATE_v2...) conviven por nombre y se recargan en caliente al cambiar el fichero.
+import csv
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+import weakref
+
+import numpy as np
+
+LABELS_ES = { "achievement": "Necesidad de Logro", "risk_propensity": "Propensión al Riesgo", "innovativeness": "Innovatividad", "locus_control": "Locus de Control Interno", "self_efficacy": "Autoeficacia", "autonomy": "Autonomía", "ambiguity_tolerance": "Tol. Ambigüedad", "emotional_stability": "Estabilidad Emocional" }
+VARIABLE_MAP = {
+    "achievement": "achievement", "logro": "achievement", "pragmatism": "achievement", "focus": "achievement", "discipline": "achievement", "tenacity": "achievement", "persistence": "achievement", "results": "achievement", "efficiency": "achievement", "profit": "achievement", "growth": "achievement", "scale": "achievement", "ambition": "achievement", "cost_saving": "achievement", "financial_focus": "achievement", "valuation": "achievement", "business_acumen": "achievement", "business": "achievement",
+    "risk_propensity": "risk_propensity", "riesgo": "risk_propensity", "risk": "risk_propensity", "courage": "risk_propensity", "audacity": "risk_propensity", "action": "risk_propensity", "speed": "risk_propensity", "investment": "risk_propensity", "debt": "risk_propensity", "financial_risk": "risk_propensity", "boldness": "risk_propensity", "bravery": "risk_propensity", "experimentation": "risk_propensity",
+    "innovativeness": "innovativeness", "innovacion": "innovativeness", "strategy": "innovativeness", "vision": "innovativeness", "creativity": "innovativeness", "adaptability": "innovativeness", "flexibility": "innovativeness", "resourcefulness": "innovativeness", "curiosity": "innovativeness", "open_minded": "innovativeness", "learning": "innovativeness", "differentiation": "innovativeness", "pivot": "innovativeness", "change": "innovativeness", "reframing": "innovativeness", "forward": "innovativeness", "imaginative": "innovativeness",
+    "locus_control": "locus_control", "locus": "locus_control", "responsibility": "locus_control", "ownership": "locus_control", "realism": "locus_control", "accountability": "locus_control", "problem_solving": "locus_control", "decision_making": "locus_control", "internal_locus": "locus_control", "proactivity": "locus_control", "self_awareness": "locus_control", "analysis": "locus_control",
+    "self_efficacy": "self_efficacy", "autoeficacia": "self_efficacy", "confidence": "self_efficacy", "assertiveness": "self_efficacy", "leadership": "self_efficacy", "negotiation": "self_efficacy", "persuasion": "self_efficacy", "influence": "self_efficacy", "sales": "self_efficacy", "communication": "self_efficacy", "management": "self_efficacy", "networking": "self_efficacy", "pricing_power": "self_efficacy", "confrontation": "self_efficacy", "collaboration": "self_efficacy", "team_focus": "self_efficacy", "mentorship": "self_efficacy", "delegation": "self_efficacy",
+    "autonomy": "autonomy", "autonomia": "autonomy", "independence": "autonomy", "freedom": "autonomy", "boundaries": "autonomy", "sovereignty": "autonomy", "identity": "autonomy", "lifestyle": "autonomy", "refusal": "autonomy", "detachment": "autonomy",
+    "ambiguity_tolerance": "ambiguity_tolerance", "tolerancia": "ambiguity_tolerance", "patience": "ambiguity_tolerance", "resilience": "ambiguity_tolerance", "calm": "ambiguity_tolerance", "stoicism": "ambiguity_tolerance", "hope": "ambiguity_tolerance", "optimism": "ambiguity_tolerance", "acceptance": "ambiguity_tolerance", "endurance": "ambiguity_tolerance", "trust": "ambiguity_tolerance",
+    "emotional_stability": "emotional_stability", "estabilidad": "emotional_stability", "integrity": "emotional_stability", "ethics": "emotional_stability", "values": "emotional_stability", "justice": "emotional_stability", "fairness": "emotional_stability", "transparency": "emotional_stability", "honesty": "emotional_stability", "humility": "emotional_stability", "empathy": "emotional_stability", "humanity": "emotional_stability", "culture": "emotional_stability", "loyalty": "emotional_stability", "balance": "emotional_stability", "self_care": "emotional_stability", "coherence": "emotional_stability", "respect": "emotional_stability",
+    "excitable": "excitable", "aggression": "excitable", "violence": "excitable", "anger": "excitable", "conflict": "excitable", "reaction": "excitable", "vengeance": "excitable", "impulsiveness": "excitable", "drama": "excitable",
+    "skeptical": "skeptical", "skepticism": "skeptical", "cynicism": "skeptical", "distrust": "skeptical", "suspicion": "skeptical", "hostility": "skeptical",
+    "cautious": "cautious", "caution": "cautious", "fear": "cautious", "anxiety": "cautious", "avoidance": "cautious", "prudence": "cautious", "security": "cautious", "safety": "cautious", "risk_aversion": "cautious", "conservatism": "cautious", "hesitation": "cautious", "paralysis": "cautious", "trust_risk": "cautious", "delay": "cautious",
+    "reserved": "reserved", "introversion": "reserved", "isolation": "reserved", "secrecy": "reserved", "secretive": "reserved", "distance": "reserved",
+    "passive_aggressive": "passive_aggressive", "resentment": "passive_aggressive", "obstruction": "passive_aggressive", "stubbornness": "passive_aggressive", "resistance": "passive_aggressive",
+    "arrogant": "arrogant", "arrogance": "arrogant", "ego": "arrogant", "narcissism": "arrogant", "superiority": "arrogant", "elitism": "arrogant", "image": "arrogant", "spectacle": "arrogant", "vanity": "arrogant", "bluff": "arrogant", "pride": "arrogant", "class": "arrogant",
+    "mischievous": "mischievous", "cunning": "mischievous", "deceit": "mischievous", "manipulation": "mischievous", "opportunist": "mischievous", "corruption": "mischievous", "exploitation": "mischievous", "greed": "mischievous", "illegal": "mischievous", "machiavellian": "mischievous", "artificial": "mischievous", "tactics": "mischievous",
+    "melodramatic": "melodramatic", "victimism": "melodramatic", "complaint": "melodramatic", "fragility": "melodramatic", "delusion": "melodramatic", "attention_seeking": "melodramatic",
+    "diligent": "diligent", "perfectionism": "diligent", "micromanagement": "diligent", "rigidity": "diligent", "obsession": "diligent", "bureaucracy": "diligent", "complexity": "diligent",
+    "dependent": "dependent", "dependency": "dependent", "submission": "dependent", "pleaser": "dependent", "conformity": "dependent", "obedience": "dependent", "external_validation": "dependent", "reassurance": "dependent", "imitation": "dependent", "external_locus": "dependent", "weakness": "dependent", "surrender": "dependent"
+}
+FLAG_KEYS = ["excitable", "skeptical", "cautious", "reserved", "passive_aggressive", "arrogant", "mischievous", "melodramatic", "diligent", "dependent"]
+OCTAGON_KEYS = list(LABELS_ES.keys())
+DIMENSIONS = OCTAGON_KEYS + FLAG_KEYS
+DIM_INDEX = {k: i for i, k in enumerate(DIMENSIONS)}
+N_OCTAGON = len(OCTAGON_KEYS)
+N_DIMS = len(DIMENSIONS)
+
+OPTION_LETTERS = "ABCD"
+NO_ANSWER = -1  # índice de la opción "vacía" (relleno de ceros al final del eje de opciones)
+ENCODINGS = ['utf-8-sig', 'utf-8', 'latin-1', 'cp1252']
+DEFAULT_SECTOR = "TECH"
+
+# Límites del vector de puntuación: octógono en [0, 100], flags solo acotados por abajo.
+SCORE_DTYPE = np.int32
+LOWER = np.zeros(N_DIMS, dtype=SCORE_DTYPE)
+UPPER = np.array([100] * N_OCTAGON + [np.iinfo(SCORE_DTYPE).max // 2] * len(FLAG_KEYS), dtype=SCORE_DTYPE)
+
+def new_scores(): return np.zeros(N_DIMS, dtype=SCORE_DTYPE)
+
+def new_choices(n): return np.full(n, NO_ANSWER, dtype=np.int8)
+
+def octagon_dict(scores): return {k: int(scores[i]) for i, k in enumerate(OCTAGON_KEYS)}
+
+def flags_dict(scores): return {k: int(scores[N_OCTAGON + i]) for i, k in enumerate(FLAG_KEYS)}
+
+def option_available(row, letter):
+    # A y B se muestran siempre; C y D solo si tienen texto real
+    if letter in "AB": return True
+    txt = row.get(f'OPCION_{letter}_TXT')
+    return bool(txt) and txt != "None"
+
+def parse_logic(logic_str):
+    # "risk_propensity 25 | achievement 20" -> [(índice_dimensión, 25), (índice_dimensión, 20)]
+    effects = []
+    if not logic_str: return effects
+    for action in logic_str.split('|'):
+        parts = action.strip().split()
+        if len(parts) < 2: continue
+        var_code = parts[0].lower().strip()
+        try: val = int(parts[1])
+        except ValueError: continue
+        target = VARIABLE_MAP.get(var_code)
+        if target and val: effects.append((DIM_INDEX[target], val))
+    return effects
+
+def logic_errors(logic_str):
+    # Acciones que no son "variable entero" (parse_logic las ignora en silencio). Una variable que no
+    # está en VARIABLE_MAP no es un error: el banco usa muchas como etiquetas sin efecto.
+    bad = []
+    for action in (logic_str or "").split('|'):
+        parts = action.strip().split()
+        if parts and (len(parts) != 2 or not parts[1].lstrip("+-").isdigit()): bad.append(action.strip())
+    return bad
+
+def compile_stages(effects):
+    # El recorte a [0, 100] se aplica tras cada acción, así que dos efectos de distinto signo sobre la
+    # misma dimensión no conmutan con la suma. Los tramos consecutivos del mismo signo sí se pueden
+    # sumar; cada tramo restante ocupa una "etapa" que se aplica (suma + recorte) por orden.
+    runs = {}
+    for dim, val in effects:
+        r = runs.setdefault(dim, [])
+        if r and (r[-1] > 0) == (val > 0): r[-1] += val
+        else: r.append(val)
+    n_stages = max([len(r) for r in runs.values()] + [1])
+    stages = np.zeros((n_stages, N_DIMS), dtype=SCORE_DTYPE)
+    for dim, r in runs.items():
+        for j, val in enumerate(r): stages[j, dim] = val
+    return stages
+
+def apply_stages(scores, stages):
+    for stage in stages:
+        scores += stage
+        np.clip(scores, LOWER, UPPER, out=scores)
+    return scores
+
+def decode_rows(raw, prefer=None):
+    # Misma cascada de codificaciones que la carga original, pero sobre bytes ya leídos; `prefer` es
+    # la codificación detectada en la compilación anterior del mismo fichero (se prueba primero)
+    for enc in ([prefer] if prefer else []) + [e for e in ENCODINGS if e != prefer]:
+        try: data = list(csv.DictReader(io.StringIO(raw.decode(enc, errors='strict')), delimiter=';'))
+        except (UnicodeDecodeError, csv.Error): continue
+        if data and 'SECTOR' in data[0]: return data, enc
+    return [], None
+
+class ScenarioBank:
+    def __init__(self, rows, source="", version="", encoding=None):
+        self.rows = rows
+        self.source = source
+        self.name = os.path.splitext(os.path.basename(source))[0]
+        self.version = version
+        self.ref = f"{self.name}@{version}" if version else self.name
+        self.encoding = encoding
+        self.available = np.zeros((len(rows), len(OPTION_LETTERS)), dtype=bool)
+        compiled = []
+        for q, row in enumerate(rows):
+            per_option = []
+            for o, letter in enumerate(OPTION_LETTERS):
+                self.available[q, o] = option_available(row, letter)
+                per_option.append(compile_stages(parse_logic(row.get(f'OPCION_{letter}_LOGIC'))))
+            compiled.append(per_option)
+        # effects[q, o, etapa, dimensión]; las etapas de relleno son ceros (no-op, las puntuaciones ya están en rango)
+        # y la última opción (NO_ANSWER) es entera de ceros para poder marcar preguntas sin responder.
+        self.stage_counts = np.array([max([s.shape[0] for s in opts]) for opts in compiled], dtype=np.int32)
+        self.n_stages = int(self.stage_counts.max()) if len(rows) else 1
+        self.effects = np.zeros((len(rows), len(OPTION_LETTERS) + 1, self.n_stages, N_DIMS), dtype=SCORE_DTYPE)
+        for q, opts in enumerate(compiled):
+            for o, s in enumerate(opts): self.effects[q, o, :s.shape[0]] = s
+        self.effects.setflags(write=False)
+        self.available.setflags(write=False)
+        index = {}
+        for q, row in enumerate(rows): index.setdefault((row.get('SECTOR') or '').strip().upper(), []).append(q)
+        self.sectors = {code: np.array(ids, dtype=np.int32) for code, ids in index.items()}
+
+    def __len__(self): return len(self.rows)
+
+    def sector_index(self, code):
+        ids = self.sectors.get(code)
+        if ids is None: ids = self.sectors.get(DEFAULT_SECTOR, np.zeros(0, dtype=np.int32))
+        return ids
+
+    def questions(self, code): return [self.rows[q] for q in self.sector_index(code)]
+
+    def apply_option(self, scores, q, option):
+        return apply_stages(scores, self.effects[q, option, :self.stage_counts[q]])
+
+# --- CACHÉ POR VERSIÓN DE FICHERO ---
+# Cada llamada cuesta un stat(); si el fichero cambió se compila la nueva versión y se sustituye la
+# entrada de un golpe. Las sesiones solo guardan la ref de la versión con la que empezaron; las versiones
+# sustituidas se conservan RETAIN_SECONDS para que terminen, y después se liberan (_VERSIONS es débil).
+log = logging.getLogger(__name__)
+RETAIN_SECONDS = float(os.environ.get("SAPE_BANK_RETAIN", 24 * 3600))
+_BANKS = {}  # ruta -> ((mtime, tamaño), banco vigente)
+_VERSIONS = weakref.WeakValueDictionary()  # ref ("SATE_v1@<sha1>") -> banco compilado
+_RETIRED = {}  # ref -> (momento de la sustitución, banco) de versiones que aún pueden tener sesiones
+_ENCODINGS = {}  # ruta -> codificación detectada en la primera compilación
+_LOCK = threading.Lock()
+
+def file_key(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def compile_bank(path):
+    with open(path, 'rb') as f: raw = f.read()
+    version = hashlib.sha1(raw).hexdigest()[:12]
+    bank = _VERSIONS.get(f"{os.path.splitext(os.path.basename(path))[0]}@{version}")
+    if bank is not None and bank.source == path: return bank  # mismo contenido (touch, copia): no se recompila
+    rows, enc = decode_rows(raw, _ENCODINGS.get(path))
+    if enc: _ENCODINGS[path] = enc
+    bank = ScenarioBank(rows, source=path, version=version, encoding=enc)
+    if len(bank): _VERSIONS[bank.ref] = bank
+    return bank
+
+def load_bank(path):
+    path = os.path.abspath(path)
+    if not os.path.exists(path):
+        cached = _BANKS.get(path)
+        return cached[1] if cached else ScenarioBank([], source=path)
+    key = file_key(path)
+    cached = _BANKS.get(path)
+    if cached and cached[0] == key: return cached[1]
+    with _LOCK:
+        cached = _BANKS.get(path)
+        if cached and cached[0] == key: return cached[1]
+        bank = compile_bank(path)
+        if cached and not len(bank):
+            # Fichero a medio escribir o ilegible: se mantiene la versión anterior hasta el siguiente cambio
+            log.warning("Banco %s sin filas válidas; se mantiene %s", path, cached[1].ref)
+            bank = cached[1]
+        if cached and cached[1] is not bank: retire(cached[1])
+        _BANKS[path] = (key, bank)
+        return bank
+
+def retire(bank):
+    now = time.monotonic()
+    _RETIRED[bank.ref] = (now, bank)
+    for ref, (t, _) in list(_RETIRED.items()):
+        if now - t > RETAIN_SECONDS: del _RETIRED[ref]
+
+def bank_by_ref(ref):
+    # Versión concreta (p. ej. la de una sesión o un resultado guardado) si sigue en memoria
+    return _VERSIONS.get(ref)
+
+# --- REGISTRO DE BANCOS POR NOMBRE ---
+# SAPE_BANKS="SATE_v1=SATE_v1.csv,SATE_v2=SATE_v2.csv"; SAPE_BANK es el que reciben los candidatos
+# nuevos y se puede cambiar en caliente con set_active_bank().
+def parse_bank_files(spec):
+    out = {}
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        name, _, path = item.partition("=")
+        out[name.strip()] = path.strip() or f"{name.strip()}.csv"
+    return out
+
+BANK_FILES = parse_bank_files(os.environ.get("SAPE_BANKS", "SATE_v1=SATE_v1.csv,SATE_v2=SATE_v2.csv"))
+_active_bank = os.environ.get("SAPE_BANK", "SATE_v1")
+
+def bank_path(name):
+    # Nombre del registro o, si no está, ruta directa a un CSV
+    return BANK_FILES.get(name, name)
+
+def get_bank(name=None): return load_bank(bank_path(name or _active_bank))
+
+def active_bank_name(): return _active_bank  # nombre del registro (o ruta, si se activó un CSV suelto)
+
+def set_active_bank(name):
+    global _active_bank
+    if name not in BANK_FILES and not os.path.exists(name): raise ValueError(f"Banco desconocido: {name!r}")
+    _active_bank = name
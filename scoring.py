@@ -0,0 +1,141 @@
+# --- MOTOR DE PUNTUACIÓN (S.A.P.E.) ---
+# Puntuación de uno o de muchos candidatos a la vez a partir del banco compilado, sin dependencias de
+# Streamlit: lo usan la app, la API HTTP (scoring_api.py) y las herramientas offline.
+# La matriz de respuestas es (candidatos x preguntas del sector) con el índice de opción (0=A ... 3=D)
+# o NO_ANSWER (-1) para preguntas sin contestar.
+import numpy as np
+
+from scenario_bank import OPTION_LETTERS, FLAG_KEYS, N_OCTAGON, N_DIMS, NO_ANSWER, LOWER, UPPER, SCORE_DTYPE, octagon_dict, flags_dict
+
+POTENTIAL_SCALE = 150.0
+FRICTION_SCALE = 50.0
+PENALTY_SCALE = 200.0
+TRIGGER_THRESHOLD = 10
+FRICTION_ALERT = 20
+IRE_HIGH = 75
+IRE_MEDIUM = 50
+
+FRICTION_REASONS = [
+    ("excitable", "Riesgo de volatilidad emocional o reactividad."),
+    ("cautious", "Riesgo de parálisis por análisis o aversión al cambio."),
+    ("skeptical", "Dificultad para confiar y delegar."),
+    ("arrogant", "Posible exceso de confianza o subestimación de riesgos."),
+    ("mischievous", "Tendencia a tomar atajos éticos o riesgos imprudentes."),
+]
+
+def calculate_results(scores):
+    # Versión de un solo candidato; mismas operaciones (y mismo orden) que results_batch()
+    octagon = octagon_dict(scores); flags = flags_dict(scores)
+    raw_points = sum(octagon.values())
+    avg = 100 * (1 - (1 / (1 + (raw_points / POTENTIAL_SCALE))))
+    raw_friction = sum(flags.values())
+    friction = min(100, (raw_friction / FRICTION_SCALE) * 100)
+    penalty_factor = friction / PENALTY_SCALE
+    ire = avg * (1 - penalty_factor)
+    ire = min(100, max(0, ire))
+    avg = min(100, max(0, avg))
+    triggers = [k for k, v in flags.items() if v > TRIGGER_THRESHOLD]
+    return round(ire, 2), round(avg, 2), round(friction, 2), triggers, friction_reasons(friction, triggers), 0
+
+def get_ire_text(s):
+    if s > IRE_HIGH: return "Nivel de Viabilidad: ALTO (Sostenible)"
+    if s > IRE_MEDIUM: return "Nivel de Viabilidad: MEDIO (Requiere Ajustes)"
+    return "Nivel de Viabilidad: BAJO (Riesgo Operativo)"
+
+def friction_reasons(friction, triggers):
+    fric_reasons = []
+    if friction > FRICTION_ALERT: fric_reasons.append("Se detectan patrones de comportamiento limitantes bajo presión.")
+    for flag, reason in FRICTION_REASONS:
+        if flag in triggers: fric_reasons.append(reason)
+    return fric_reasons
+
+def letters_to_choices(answers):
+    # ["A", "C", "", ...] -> [0, 2, NO_ANSWER, ...]
+    return np.array([[OPTION_LETTERS.index(a) if a else NO_ANSWER for a in row] for row in answers], dtype=np.int8)
+
+def parse_answers(answers):
+    # Un juego de respuestas: "ABCA-..." (guion = sin responder), ["A", "B", ...] o [0, 1, ...]
+    if isinstance(answers, str): answers = list(answers)
+    out = np.empty(len(answers), dtype=np.int8)
+    for i, a in enumerate(answers):
+        if isinstance(a, str):
+            a = a.strip().upper()
+            if a in ("", "-"): out[i] = NO_ANSWER; continue
+            if a not in OPTION_LETTERS: raise ValueError(f"Respuesta {i + 1}: opción '{a}' no válida")
+            out[i] = OPTION_LETTERS.index(a)
+        elif isinstance(a, int) and not isinstance(a, bool) and NO_ANSWER <= a < len(OPTION_LETTERS): out[i] = a
+        else: raise ValueError(f"Respuesta {i + 1}: opción {a!r} no válida")
+    return out
+
+def sector_questions(bank, code):
+    # A diferencia de la app (que cae en TECH), aquí un sector desconocido es un error
+    code = (code or "").strip().upper()
+    if code not in bank.sectors or not code: raise ValueError(f"Sector desconocido: {code!r}")
+    return code, bank.sector_index(code)
+
+def validate_choices(bank, qids, choices):
+    if choices.ndim != 2 or choices.shape[1] != len(qids):
+        raise ValueError(f"Se esperaban {len(qids)} respuestas por candidato, recibidas {choices.shape[-1]}")
+    answered = choices != NO_ANSWER
+    if ((choices < NO_ANSWER) | (choices >= len(OPTION_LETTERS))).any():
+        raise ValueError("Código de opción fuera de rango")
+    ok = bank.available[qids[None, :], np.where(answered, choices, 0)] | ~answered
+    if not ok.all():
+        cand, col = np.argwhere(~ok)[0]
+        raise ValueError(f"Candidato {cand}: la opción {OPTION_LETTERS[choices[cand, col]]} no existe en la pregunta {col + 1}")
+
+def score_choices(bank, qids, choices, validate=True, initial=None):
+    # Una pasada por pregunta (y por etapa), vectorizada sobre todos los candidatos: reproduce el
+    # recorte 0-100 de cada respuesta exactamente igual que la aplicación pregunta a pregunta.
+    # `initial` es el vector de partida (p. ej. un test a medias); por defecto, ceros.
+    choices = np.asarray(choices)
+    if choices.ndim == 1: choices = choices[None, :]
+    qids = np.asarray(qids)
+    if validate: validate_choices(bank, qids, choices)
+    scores = np.zeros((choices.shape[0], N_DIMS), dtype=SCORE_DTYPE)
+    if initial is not None: scores[:] = initial
+    for col, q in enumerate(qids):
+        effects = bank.effects[q]
+        picked = choices[:, col]
+        for stage in range(bank.stage_counts[q]):
+            scores += effects[picked, stage]
+            np.clip(scores, LOWER, UPPER, out=scores)
+    return scores
+
+def score_sector(bank, code, choices, validate=True):
+    return score_choices(bank, bank.sector_index(code), choices, validate)
+
+def results_batch(scores):
+    # Equivalente vectorizado de calculate_results() (sin redondear; usar np.round(x, 2) para mostrar)
+    scores = np.asarray(scores)
+    octagon = scores[:, :N_OCTAGON]; flags = scores[:, N_OCTAGON:]
+    raw_points = octagon.sum(axis=1, dtype=np.int64)
+    avg = 100 * (1 - (1 / (1 + (raw_points / POTENTIAL_SCALE))))
+    raw_friction = flags.sum(axis=1, dtype=np.int64)
+    friction = np.minimum(100, (raw_friction / FRICTION_SCALE) * 100)
+    ire = avg * (1 - friction / PENALTY_SCALE)
+    return {
+        "octagon": octagon, "flags": flags,
+        "ire": np.clip(ire, 0, 100), "potential": np.clip(avg, 0, 100), "friction": friction,
+        "triggers": flags > TRIGGER_THRESHOLD,
+    }
+
+def trigger_names(trigger_row): return [k for k, hit in zip(FLAG_KEYS, trigger_row) if hit]
+
+def score_answer_sets(bank, code, answer_sets):
+    # Entrada/salida en tipos nativos (JSON): una lista de juegos de respuestas de un mismo sector
+    code, qids = sector_questions(bank, code)
+    choices = np.stack([parse_answers(a) for a in answer_sets]) if answer_sets else np.zeros((0, len(qids)), dtype=np.int8)
+    scores = score_choices(bank, qids, choices)
+    res = results_batch(scores)
+    out = []
+    for i in range(len(scores)):
+        triggers = trigger_names(res["triggers"][i])
+        ire = round(float(res["ire"][i]), 2)
+        out.append({
+            "sector": code, "bank_version": bank.ref,
+            "ire": ire, "potential": round(float(res["potential"][i]), 2), "friction": round(float(res["friction"][i]), 2),
+            "level": get_ire_text(ire), "triggers": triggers, "reasons": friction_reasons(float(res["friction"][i]), triggers),
+            "octagon": octagon_dict(scores[i]), "flags": flags_dict(scores[i]),
+        })
+    return out
@@ -0,0 +1,173 @@
+# --- API HTTP DE PUNTUACIÓN (asyncio, sin Streamlit) ---
+# Servidor HTTP/1.1 mínimo (keep-alive) sobre asyncio y la librería estándar, con el mismo motor que la
+# app. Con --workers N el socket se abre una vez y N procesos aceptan conexiones sobre él.
+#
+#   python scoring_api.py --port 8502 --workers 4
+#
+#   POST /score   {"sector": "TECH", "answers": "ABCA...", "bank": "SATE_v2", "pdf": false, "id": "...", "user": {"name": ...}}
+#   POST /score   {"candidates": [{"sector": "TECH", "answers": [...]}, ...]}   (lote; mismo orden en la salida)
+#   GET  /health
+#
+# "bank" es opcional (por defecto, el banco activo: SAPE_BANK) y solo admite nombres del registro.
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from reports import PDF_AVAILABLE, render_report, report_payload
+from scenario_bank import BANK_FILES, NO_ANSWER, OPTION_LETTERS, active_bank_name, get_bank
+from scoring import parse_answers, score_answer_sets, sector_questions
+
+MAX_BODY = 32 * 1024 * 1024
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message); self.status = status
+
+# --- PUNTUACIÓN ---
+def candidate_choices(bank, code, i, answers):
+    # Valida las respuestas de un candidato (tipo, códigos, longitud y opciones existentes) -> [int, ...]
+    if not isinstance(answers, (str, list)): raise HTTPError(400, f"Candidato {i}: 'answers' debe ser un texto o una lista")
+    try:
+        code, qids = sector_questions(bank, code)
+        choices = parse_answers(answers)
+    except ValueError as e: raise HTTPError(400, f"Candidato {i}: {e}")
+    if len(choices) != len(qids): raise HTTPError(400, f"Candidato {i}: se esperaban {len(qids)} respuestas para {code}, recibidas {len(choices)}")
+    answered = choices != NO_ANSWER
+    missing = ~bank.available[qids, np.where(answered, choices, 0)] & answered
+    if missing.any():
+        col = int(np.argmax(missing))
+        raise HTTPError(400, f"Candidato {i}: la opción {OPTION_LETTERS[choices[col]]} no existe en la pregunta {col + 1}")
+    return choices.tolist()
+
+def check_report_fields(i, c):
+    # Campos que solo usa el PDF: con "pdf": true, un tipo incorrecto es un 400 y no un fallo del worker
+    if c.get("user") is not None and not isinstance(c["user"], dict): raise HTTPError(400, f"Candidato {i}: 'user' debe ser un objeto")
+    finished_at = c.get("finished_at")
+    if finished_at is None: return
+    try: datetime.fromisoformat(finished_at)
+    except (TypeError, ValueError): raise HTTPError(400, f"Candidato {i}: 'finished_at' debe ser una fecha ISO (p. ej. 2026-01-19T12:45:00), recibido {finished_at!r}") from None
+
+def score_candidates(candidates):
+    # Agrupa por banco y sector para puntuar cada grupo en una sola pasada vectorizada
+    groups = {}
+    for i, c in enumerate(candidates):
+        if not isinstance(c, dict) or "answers" not in c: raise HTTPError(400, f"Candidato {i}: falta 'answers'")
+        if c.get("pdf"): check_report_fields(i, c)
+        name = c.get("bank") or active_bank_name()
+        if name not in BANK_FILES: raise HTTPError(400, f"Candidato {i}: banco desconocido {name!r}")
+        groups.setdefault((name, str(c.get("sector", "")).strip().upper()), []).append(i)
+    out = [None] * len(candidates)
+    banks = {name: get_bank(name) for name, _ in groups}  # una versión por banco para toda la petición
+    for (name, code), idx in groups.items():
+        answer_sets = [candidate_choices(banks[name], code, i, candidates[i]["answers"]) for i in idx]
+        try: results = score_answer_sets(banks[name], code, answer_sets)
+        except ValueError as e: raise HTTPError(400, str(e))
+        for i, r in zip(idx, results):
+            if candidates[i].get("id") is not None: r["id"] = candidates[i]["id"]
+            out[i] = r
+    return out
+
+def render_pdf(candidate, result):
+    results = (result["ire"], result["potential"], result["friction"], result["triggers"], result["reasons"], 0)
+    payload = report_payload(candidate.get("id", ""), candidate.get("user") or {}, results, result["octagon"], result["flags"], candidate.get("finished_at"))
+    return base64.b64encode(render_report(payload)).decode("ascii")
+
+async def handle_score(body):
+    try: data = json.loads(body or b"{}")
+    except json.JSONDecodeError as e: raise HTTPError(400, f"JSON inválido: {e}")
+    if not isinstance(data, dict): raise HTTPError(400, "Se esperaba un objeto JSON")
+    batch = "candidates" in data
+    candidates = data["candidates"] if batch else [data]
+    if not isinstance(candidates, list): raise HTTPError(400, "'candidates' debe ser una lista")
+    results = score_candidates(candidates)
+    pdf_jobs = [(c, r) for c, r in zip(candidates, results) if c.get("pdf")]
+    if pdf_jobs:
+        if not PDF_AVAILABLE: raise HTTPError(400, "Generación de PDF no disponible (falta reportlab)")
+        loop = asyncio.get_running_loop()
+        pdfs = await asyncio.gather(*(loop.run_in_executor(None, render_pdf, c, r) for c, r in pdf_jobs))
+        for (c, r), pdf in zip(pdf_jobs, pdfs): r["pdf"] = pdf
+    return {"results": results} if batch else results[0]
+
+async def dispatch(method, path, body):
+    path = path.split("?", 1)[0]
+    if path == "/health":
+        return 200, {"status": "ok", "active_bank": active_bank_name(), "banks": {name: get_bank(name).ref for name in BANK_FILES}, "pid": os.getpid()}
+    if path == "/score":
+        if method != "POST": raise HTTPError(405, "Usa POST")
+        return 200, await handle_score(body)
+    raise HTTPError(404, "Ruta no encontrada")
+
+# --- HTTP/1.1 ---
+async def handle_connection(reader, writer):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line: break
+            try: method, path, version = line.decode("latin-1").split()
+            except ValueError: break
+            headers = {}
+            while True:
+                h = await reader.readline()
+                if h in (b"\r\n", b"\n", b""): break
+                k, _, v = h.decode("latin-1").partition(":"); headers[k.strip().lower()] = v.strip()
+            declared = headers.get("content-length") or "0"
+            length = int(declared) if declared.isdigit() else -1  # sin signo, espacios ni '_'
+            try:
+                if length < 0: raise HTTPError(400, "Content-Length inválido")
+                if length > MAX_BODY: raise HTTPError(413, "Cuerpo demasiado grande")
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await dispatch(method, path, body)
+            except HTTPError as e: status, payload = e.status, {"error": str(e)}
+            except Exception as e: status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close" and status != 413 and length >= 0
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            head = f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json; charset=utf-8\r\nContent-Length: {len(data)}\r\n"
+            if not keep_alive: head += "Connection: close\r\n"
+            writer.write(head.encode("latin-1") + b"\r\n" + data)
+            await writer.drain()
+            if not keep_alive: break
+    except (asyncio.IncompleteReadError, ConnectionError): pass
+    finally:
+        writer.close()
+
+async def serve(sock):
+    for name in BANK_FILES: get_bank(name)  # compilar antes de aceptar peticiones
+    server = await asyncio.start_server(handle_connection, sock=sock)
+    async with server: await server.serve_forever()
+
+def run_worker(sock):
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    asyncio.run(serve(sock))
+
+def main():
+    ap = argparse.ArgumentParser(description="API HTTP de puntuación S.A.P.E.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8502)
+    ap.add_argument("--workers", type=int, default=1)
+    args = ap.parse_args()
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    print(f"Escuchando en http://{args.host}:{args.port} con {args.workers} proceso(s)")
+    if args.workers <= 1: run_worker(sock); return
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=run_worker, args=(sock,), daemon=True) for _ in range(args.workers)]
+    for p in procs: p.start()
+    # SIGTERM al padre también para los workers (terminate() no ejecuta la limpieza de multiprocessing)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for p in procs: p.join()
+    except (KeyboardInterrupt, SystemExit): pass
+    finally:
+        for p in procs: p.terminate()
+
+if __name__ == "__main__":
+    main()
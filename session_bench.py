@@ -0,0 +1,87 @@
+# --- BENCHMARK DE MEMORIA POR SESIÓN (S.A.P.E.) ---
+# Construye N estados de sesión de candidatos a mitad de test con cada disposición y mide con
+# tracemalloc los bytes que añade cada sesión (lo compartido entre sesiones, como el banco
+# compilado, se carga antes y no cuenta).
+#
+#   python session_bench.py --sessions 500
+#
+#   original   : filas del sector parseadas por sesión (carga del CSV en cada go_sector) + octógono y flags en dicts
+#   compartida : lista de referencias a las filas del banco compartido + índices + respuestas en lista
+#   compacta   : ref de versión + sector + paso + opciones int8 + vector de puntuación (estado actual)
+import argparse
+import csv
+import io
+import json
+import random
+import string
+import tracemalloc
+
+from scenario_bank import DEFAULT_SECTOR, FLAG_KEYS, LABELS_ES, load_bank, new_choices, new_scores
+
+def common(rng):
+    # Campos iguales en todas las disposiciones (login, datos del candidato, flags de navegación)
+    return {
+        "current_step": 20, "finished": False, "started": True, "data_verified": True, "auth": True, "oryon_auth": False, "saved": False,
+        "user_id": "".join(rng.choices(string.ascii_uppercase + string.digits, k=6)),
+        "user_data": {"name": f"Candidato {rng.randrange(10**6)}", "age": 30, "gender": "Femenino", "country": "España", "situation": "Solo", "sector": "Startup Tecnológica (Scalable)", "experience": "Primer emprendimiento"},
+    }
+
+def original_session(rng, text, code):
+    s = common(rng)
+    all_q = list(csv.DictReader(io.StringIO(text), delimiter=';'))
+    s["data"] = [x for x in all_q if x['SECTOR'].strip().upper() == code]
+    s["octagon"] = {k: rng.randrange(100) for k in LABELS_ES}
+    s["flags"] = {k: rng.randrange(30) for k in FLAG_KEYS}
+    return s
+
+def shared_session(rng, bank, code):
+    s = common(rng)
+    s["bank"] = bank; s["sector_code"] = code
+    s["q_index"] = bank.sector_index(code); s["data"] = bank.questions(code)
+    s["answers"] = [rng.randrange(4) for _ in range(20)]
+    s["scores"] = new_scores()
+    return s
+
+def compact_session(rng, bank, code):
+    s = common(rng)
+    s["bank_ref"] = bank.ref; s["sector_code"] = code
+    s["choices"] = new_choices(len(bank.sector_index(code))); s["choices"][:20] = [rng.randrange(4) for _ in range(20)]
+    s["scores"] = new_scores()
+    return s
+
+def measure(build, n):
+    rng = random.Random(0)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sessions = [build(rng) for _ in range(n)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    del sessions
+    return total / n
+
+def run(bank_file, n, code=DEFAULT_SECTOR):
+    bank = load_bank(bank_file)
+    with open(bank.source, 'rb') as f: text = f.read().decode(bank.encoding)
+    layouts = {
+        "original": lambda rng: original_session(rng, text, code),
+        "compartida": lambda rng: shared_session(rng, bank, code),
+        "compacta": lambda rng: compact_session(rng, bank, code),
+    }
+    return {"bank": bank.ref, "sessions": n, "bytes_per_session": {name: round(measure(build, n)) for name, build in layouts.items()}}
+
+def main():
+    ap = argparse.ArgumentParser(description="Bytes de memoria por sesión de candidato según la disposición del estado")
+    ap.add_argument("--bank", default="SATE_v1.csv")
+    ap.add_argument("--sessions", type=int, default=500)
+    ap.add_argument("--out")
+    args = ap.parse_args()
+    report = run(args.bank, args.sessions)
+    base = report["bytes_per_session"]["original"]
+    for name, b in report["bytes_per_session"].items():
+        print(f"{name:<12}{b:>10,} B/sesión  ({b / base:.1%} del original)")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=1)
+
+if __name__ == "__main__":
+    main()
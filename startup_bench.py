@@ -0,0 +1,139 @@
+# --- BENCHMARK DE ARRANQUE POR ROL (S.A.P.E.) ---
+# Mide, en un proceso nuevo por rol, el tiempo de import (PYTHONPROFILEIMPORTTIME, solo lo que se importa
+# durante el rol) y la RSS máxima, y comprueba que cada rol no cargue pilas que no le corresponden.
+#
+#   python startup_bench.py --out startup.json
+#   python startup_bench.py --baseline startup.json --tolerance 0.25   (sale con 1 si hay regresión)
+#
+# Roles: login (primera pantalla), candidato (datos, sector y primera pregunta), resultados (test
+# completo e informe), oryon (panel de entidad) y api (scoring_api.py sin Streamlit).
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+ROLES = ["login", "candidato", "resultados", "oryon", "api"]
+MARKER = "startup_bench: inicio de rol"
+HEAVY = ["numpy", "pandas", "plotly.express", "plotly.graph_objects", "reportlab", "streamlit"]
+# Pilas que cada rol NO debe importar (streamlit ya trae plotly.graph_objects para st.plotly_chart)
+FORBIDDEN = {
+    "login": ["numpy", "pandas", "plotly.express", "reportlab"],
+    "candidato": ["pandas", "plotly.express", "reportlab"],
+    "resultados": ["pandas", "plotly.express", "reportlab"],
+    "oryon": ["reportlab"],
+    "api": ["streamlit", "pandas", "plotly", "reportlab"],
+}
+
+def rss_mb(): return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def click(at, label=None, key_prefix=None):
+    button = next(b for b in at.button if (label is None or b.label == label) and (key_prefix is None or (b.key or "").startswith(key_prefix)))
+    button.click(); at.run()
+
+def option_buttons(at): return [b for b in at.button if b.key and b.key[:2] in ("A_", "B_", "C_", "D_")]
+
+def drive(role, at):
+    at.run()
+    if role == "login": return
+    if role == "oryon":
+        at.text_input(key="pwd_oryon").input("ORYON2026"); click(at, "ACCESO ENTIDAD"); return
+    at.text_input(key="pwd_cand").input("admin"); click(at, "ACCESO EMPRENDEDOR")
+    at.text_input(key="name_input").input("Benchmark"); at.checkbox[0].check(); click(at, "VALIDAR DATOS Y CONTINUAR")
+    at.button[0].click(); at.run()
+    while option_buttons(at):
+        option_buttons(at)[0].click(); at.run()
+        if role == "candidato": return
+
+def child(role):
+    # Se ejecuta con PYTHONPROFILEIMPORTTIME; se quita del entorno para que los workers del pool de PDF
+    # (procesos nuevos) no mezclen sus imports en el stderr. El padre solo suma lo posterior a MARKER.
+    os.environ.pop("PYTHONPROFILEIMPORTTIME", None)
+    os.environ["SAPE_RESULTS_DB"] = os.path.join(tempfile.mkdtemp(prefix="sape_bench_"), "resultados.db")
+    sys.path.insert(0, os.path.dirname(APP))
+    if role != "api":
+        from streamlit.testing.v1 import AppTest
+        at = AppTest.from_file(APP, default_timeout=120)
+    base = rss_mb()
+    print(MARKER, file=sys.stderr, flush=True)
+    t = time.perf_counter()
+    if role == "api":
+        import scoring_api
+        bank = scoring_api.get_bank()
+        code = next(c for c in bank.sectors if c)
+        scoring_api.score_candidates([{"sector": code, "answers": "A" * len(bank.sectors[code])}])
+    else:
+        drive(role, at)
+        if at.exception: raise RuntimeError(at.exception[0].value)
+    elapsed = time.perf_counter() - t
+    out = {"run_ms": elapsed * 1000, "rss_base_mb": base, "rss_mb": rss_mb(), "loaded": [m for m in HEAVY + ["plotly"] if m in sys.modules]}
+    if role != "api":
+        import reports, results_store
+        reports.shutdown_pool(); results_store.close_all()
+    print(json.dumps(out))
+
+def parse_importtime(stderr):
+    total_us = 0; n = 0; started = False
+    for line in stderr.splitlines():
+        if line.startswith(MARKER): started = True; continue
+        if not started or not line.startswith("import time:") or "self [us]" in line: continue
+        total_us += int(line.split(":", 1)[1].split("|")[0]); n += 1
+    return total_us / 1000, n
+
+def measure(role):
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", role], capture_output=True, text=True,
+                          cwd=os.path.dirname(APP), env={**os.environ, "PYTHONPROFILEIMPORTTIME": "1"})
+    if proc.returncode: raise RuntimeError(f"{role}: {proc.stderr[-2000:]}")
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    out["import_ms"], out["modules"] = parse_importtime(proc.stderr)
+    return out
+
+def run(roles, repeat):
+    report = {}
+    for role in roles:
+        samples = [measure(role) for _ in range(repeat)]
+        report[role] = {k: round(statistics.median(s[k] for s in samples), 1) for k in ("import_ms", "modules", "run_ms", "rss_base_mb", "rss_mb")}
+        report[role]["loaded"] = samples[-1]["loaded"]
+        report[role]["forbidden"] = [m for m in FORBIDDEN[role] if m in samples[-1]["loaded"]]
+    return report
+
+def regressions(report, baseline, tolerance):
+    out = []
+    for role, r in report.items():
+        if r["forbidden"]: out.append(f"{role}: importa {', '.join(r['forbidden'])}")
+        b = baseline.get(role)
+        if not b: continue
+        for key in ("import_ms", "rss_mb"):
+            if r[key] > b[key] * (1 + tolerance): out.append(f"{role}: {key} {r[key]} > {b[key]} (+{tolerance:.0%})")
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Tiempo de import y RSS de arranque por rol")
+    ap.add_argument("--child", choices=ROLES, help=argparse.SUPPRESS)
+    ap.add_argument("--roles", nargs="*", choices=ROLES, default=ROLES)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", help="guarda el resultado en JSON (p. ej. como nueva referencia)")
+    ap.add_argument("--baseline", help="JSON de referencia con el que comparar")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    args = ap.parse_args()
+    if args.child: child(args.child); return
+    report = run(args.roles, args.repeat)
+    print(f"{'rol':<12}{'import ms':>10}{'módulos':>9}{'run ms':>9}{'RSS MB':>9}  pilas cargadas")
+    for role, r in report.items():
+        print(f"{role:<12}{r['import_ms']:>10.1f}{r['modules']:>9.0f}{r['run_ms']:>9.0f}{r['rss_mb']:>9.1f}  {', '.join(r['loaded'])}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f: json.dump(report, f, ensure_ascii=False, indent=1)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f: baseline = json.load(f)
+    problems = regressions(report, baseline, args.tolerance)
+    for p in problems: print(f"REGRESIÓN {p}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(scope="session")
+def bank():
+    from scenario_bank import load_bank
+    return load_bank(os.path.join(ROOT, "SATE_v1.csv"))
+
+@pytest.fixture
+def store(tmp_path):
+    from results_store import ResultsStore
+    s = ResultsStore(str(tmp_path / "resultados.db"))
+    yield s
+    s.close()
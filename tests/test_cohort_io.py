@@ -0,0 +1,69 @@
+# Importación de hojas de respuestas: reglas de rechazo, duplicados y recuento de filas importadas
+import io
+
+from cohort_io import import_sheet
+from results_store import make_record
+
+def sheet(bank, rows, sector="TECH"):
+    # rows: [(id, [letras])]; una columna P por pregunta del sector
+    n = len(bank.sector_index(sector))
+    lines = ["id;sector_code;name;" + ";".join(f"P{k}" for k in range(1, n + 1))]
+    lines += [f"{rid};{sector};Ana;" + ";".join(letters) for rid, letters in rows]
+    return io.StringIO("\n".join(lines) + "\n")
+
+def complete(bank, letter="A", sector="TECH"):
+    # Todas las preguntas respondidas con `letter` (o con la A si esa opción no existe en la pregunta)
+    o = "ABCD".index(letter)
+    return [letter if bank.available[q, o] else "A" for q in bank.sector_index(sector)]
+
+def answers(store, result_id):
+    return store.connection().execute("SELECT option FROM answers WHERE result_id = ? ORDER BY step", (result_id,)).fetchall()
+
+def test_valid_rows_are_scored_and_stored(store, bank):
+    r = import_sheet(store, sheet(bank, [("X1", complete(bank, "A")), ("X2", complete(bank, "B"))]), bank)
+    assert (r["rows"], r["valid"], r["imported"], r["duplicates"], r["rejected"]) == (2, 2, 2, 0, 0)
+    assert store.get("X1")["code"] == "X1" and store.get("X1")["questions_asked"] == len(bank.sector_index("TECH"))
+
+def test_incomplete_rows_are_rejected(store, bank):
+    partial = complete(bank, "A"); partial[20:] = [""] * (len(partial) - 20)
+    short = complete(bank, "A")[:-1]
+    r = import_sheet(store, sheet(bank, [("X1", partial), ("X2", short)]), bank)
+    assert r["imported"] == 0 and r["rejected"] == 2
+    assert "sin responder" in r["errors"][0] and "sin responder" in r["errors"][1]
+    assert store.count() == 0 and store.sector_stats() == {}
+
+def test_repeated_id_in_a_sheet_is_rejected(store, bank):
+    r = import_sheet(store, sheet(bank, [("X1", complete(bank, "A")), ("X1", complete(bank, "B"))]), bank, batch=1)
+    assert r["imported"] == 1 and r["rejected"] == 1
+    assert r["errors"] == ["Línea 3: id 'X1' repetido (ya en la línea 2)"]
+    assert {o for (o,) in answers(store, "X1")} == {"A"}
+
+def test_existing_id_is_a_duplicate_and_keeps_its_answers(store, bank):
+    qids = bank.sector_index("TECH"); n = len(qids)
+    store.write_batch([make_record("X1", {}, "TECH", bank.ref, [0] * 18, (0, 0, 0, []), qids, [0] * 20 + [-1] * (n - 20), projection=[0] * 18)])
+    r = import_sheet(store, sheet(bank, [("X1", complete(bank, "B"))]), bank)
+    assert (r["valid"], r["imported"], r["duplicates"]) == (1, 0, 1)
+    assert len(answers(store, "X1")) == 20 and store.get("X1")["questions_asked"] == 20
+
+def test_invalid_options_are_rejected_with_their_line(store, bank):
+    bad = complete(bank, "A"); bad[0] = "Z"
+    r = import_sheet(store, sheet(bank, [("X1", complete(bank, "A")), ("X2", bad)]), bank)
+    assert r["imported"] == 1 and r["errors"] == ["Línea 3: Respuesta 1: opción 'Z' no válida"]
+
+def test_unknown_sector_is_rejected(store, bank):
+    r = import_sheet(store, io.StringIO("id;sector_code;P1\nX1;NOPE;A\n"), bank)
+    assert r["imported"] == 0 and r["rejected"] == 1 and "Sector desconocido" in r["errors"][0]
+
+def test_imported_counts_only_this_sheet_with_concurrent_writers(store, bank):
+    # Otro escritor (la app u otro proceso) guarda un resultado mientras se importa
+    qids = bank.sector_index("TECH"); write_batch = store.write_batch
+    def concurrent(records, con=None):
+        write_batch([make_record("APP1", {}, "TECH", bank.ref, [0] * 18, (0, 0, 0, []), qids, [0] * len(qids))])
+        return write_batch(records, con)
+    store.write_batch = concurrent
+    r = import_sheet(store, sheet(bank, [("X1", complete(bank, "A"))]), bank)
+    assert r["imported"] == 1 and store.count() == 2
+
+def test_dry_run_stores_nothing(store, bank):
+    r = import_sheet(store, sheet(bank, [("X1", complete(bank, "A"))]), bank, dry_run=True)
+    assert r["valid"] == 1 and r["imported"] == 0 and store.count() == 0
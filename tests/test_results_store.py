@@ -0,0 +1,109 @@
+# Almacén de resultados: reenvíos, agregados por trigger y migraciones desde bases antiguas
+import sqlite3
+
+import pytest
+
+from norms import SKETCH_METRICS
+from results_store import AGGREGATES, DIMENSIONS, QUANTILES, SCHEMA_VERSION, STAT_SUMS, USER_FIELDS, ResultsStore, make_record
+from scoring import calculate_results, score_choices
+
+def record(bank, result_id, choices, sector="TECH", projection=None, **kw):
+    qids = bank.sector_index(sector)
+    scores = score_choices(bank, qids, choices)[0]
+    return make_record(result_id, {"name": result_id}, sector, bank.ref, scores, calculate_results(scores), qids, choices, projection=projection, **kw)
+
+def answers(store, result_id):
+    return store.connection().execute("SELECT step, question, option FROM answers WHERE result_id = ? ORDER BY step", (result_id,)).fetchall()
+
+def test_resubmission_is_ignored_with_its_answers(store, bank):
+    n = len(bank.sector_index("TECH"))
+    first = record(bank, "R1", [0] * 20 + [-1] * (n - 20), projection=[0] * len(DIMENSIONS))
+    assert store.write_batch([first]) == 1
+    before = (store.get("R1"), answers(store, "R1"))
+    assert store.write_batch([record(bank, "R1", [1] * n)]) == 0
+    assert (store.get("R1"), answers(store, "R1")) == before
+    assert len(before[1]) == 20 and {o for _, _, o in before[1]} == {"A"}
+
+def test_resubmission_through_the_writer_thread(store, bank):
+    n = len(bank.sector_index("TECH"))
+    store.submit(record(bank, "R1", [2] * n)); store.submit(record(bank, "R1", [3] * n)); store.flush()
+    assert store.count() == 1
+    assert {o for _, _, o in answers(store, "R1")} == {"C"}
+    assert store.sector_stats()["TECH"]["n"] == 1
+
+def test_display_code_is_kept_apart_from_the_key(store, bank):
+    n = len(bank.sector_index("TECH"))
+    store.write_batch([record(bank, "a" * 32, [0] * n, code="ABC123")])
+    assert store.get("a" * 32)["code"] == "ABC123"
+    assert store.page(0, 10)[0][0] == "ABC123"
+
+def test_projected_results_stay_out_of_aggregates(store, bank):
+    n = len(bank.sector_index("TECH"))
+    store.write_batch([record(bank, "FULL", [0] * n), record(bank, "PART", [0] * 20 + [-1] * (n - 20), projection=[50] * len(DIMENSIONS))])
+    assert store.count() == 2 and store.sector_counts() == {"TECH": 2}
+    assert store.sector_stats()["TECH"]["n"] == 1
+    assert all(s.n == 1 for s in store.sketches("TECH").values())
+
+# --- MIGRACIONES ---
+LEGACY_RESULTS = f"""
+CREATE TABLE results (
+    id TEXT PRIMARY KEY, finished_at TEXT NOT NULL,
+    {", ".join(f"{f} {'INTEGER' if f == 'age' else 'TEXT'}" for f in USER_FIELDS)},
+    sector_code TEXT NOT NULL, bank_version TEXT, ire REAL, potential REAL, friction REAL, triggers TEXT,
+    {", ".join(f"{d} INTEGER NOT NULL DEFAULT 0" for d in DIMENSIONS)}
+);
+CREATE TABLE answers (result_id TEXT NOT NULL, step INTEGER NOT NULL, question INTEGER NOT NULL, option TEXT NOT NULL, PRIMARY KEY (result_id, step)) WITHOUT ROWID;
+"""
+# Agregados de la v1/v2: sin cubetas de cuantiles (v1) y con triggers sin filtro que aquí solo dejan rastro
+LEGACY_AGGREGATES = AGGREGATES + """
+CREATE TRIGGER results_aggregate AFTER INSERT ON results BEGIN
+    UPDATE sector_stats SET n = n + 1 WHERE sector_code = NEW.sector_code;
+END;
+"""
+LEGACY_QUANTILES = QUANTILES + """
+CREATE TRIGGER results_quantiles AFTER INSERT ON results BEGIN
+    INSERT OR IGNORE INTO quantile_bins VALUES (NEW.sector_code, 'ire', 0, 1);
+END;
+"""
+
+def legacy_db(path, version, bank, rows):
+    # Base de la versión `version` (0: solo resultados) con `rows` [(sector, opciones)] ya guardadas
+    con = sqlite3.connect(path)
+    con.executescript(LEGACY_RESULTS + (LEGACY_AGGREGATES if version >= 1 else "") + (LEGACY_QUANTILES if version >= 2 else ""))
+    columns = ["id", "finished_at"] + USER_FIELDS + ["sector_code", "bank_version", "ire", "potential", "friction", "triggers"] + DIMENSIONS
+    for i, (sector, choices) in enumerate(rows):
+        r = record(bank, f"OLD{i:03d}", choices, sector)
+        con.execute(f"INSERT INTO results ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", [r[c] for c in columns])
+        con.executemany("INSERT INTO answers VALUES (?, ?, ?, ?)", [(r["id"], *a) for a in r["answers"]])
+    if version >= 1: con.execute(f"INSERT INTO sector_stats VALUES ('TECH', 999, 0, 0{', 0' * len(STAT_SUMS)})")  # agregados desfasados
+    con.execute(f"PRAGMA user_version = {version}"); con.commit(); con.close()
+
+@pytest.mark.parametrize("version", [0, 1, 2, 3])
+def test_migration_rebuilds_aggregates_and_quantiles(tmp_path, bank, version):
+    rows = [("TECH", [o % 4 if bank.available[q, o % 4] else 0 for q in bank.sector_index("TECH")]) for o in range(6)]
+    rows += [("PYME", [0] * len(bank.sector_index("PYME")))] * 3
+    path = str(tmp_path / "old.db")
+    if version == 3:  # v3: mismas columnas que ahora salvo `code`
+        s = ResultsStore(path); s.write_batch([record(bank, f"OLD{i:03d}", c, sector) for i, (sector, c) in enumerate(rows)]); s.close()
+        con = sqlite3.connect(path); con.execute("PRAGMA user_version = 3"); con.execute("UPDATE results SET code = NULL"); con.commit(); con.close()
+    else: legacy_db(path, version, bank, rows)
+    store = ResultsStore(path)
+    try:
+        con = store.connection()
+        assert con.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert con.execute("SELECT COUNT(*) FROM results WHERE code = id").fetchone()[0] == len(rows)
+        stats = store.sector_stats()
+        assert {c: s["n"] for c, s in stats.items()} == {"TECH": 6, "PYME": 3}
+        ire = con.execute("SELECT sector_code, TOTAL(ire) FROM results GROUP BY 1").fetchall()
+        assert all(stats[c]["sum_ire"] == pytest.approx(total) for c, total in ire)
+        assert sum(n for _, _, _, n, _ in store.risk_grid()) == len(rows)
+        for sector, n in (("TECH", 6), ("PYME", 3)):
+            assert all(s.n == n for s in store.sketches(sector).values()), sector
+        assert set(store.sketches("TECH")) == set(SKETCH_METRICS)
+        # Los triggers antiguos se sustituyen: una fila nueva cuenta una vez y una proyectada no cuenta
+        n = len(bank.sector_index("TECH"))
+        store.write_batch([record(bank, "NEW", [0] * n), record(bank, "PART", [0] * 10 + [-1] * (n - 10), projection=[0] * len(DIMENSIONS))])
+        assert store.sector_stats()["TECH"]["n"] == 7
+        assert store.sketches("TECH")["ire"].n == 7
+    finally:
+        store.close()